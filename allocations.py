@@ -0,0 +1,8 @@
+"""
+    Objects and surfaces made for the game's sprites, counted by kind.  The code that makes one adds to its count here
+    so the profiler in debug.py can show how many were made in each frame.  Once every tetromino is recycled from the
+    pool in tetromino.py, a frame with a lock makes none.
+"""
+
+ALLOCATIONS = ('tetrominos', 'blocks', 'surfaces')
+allocations = dict.fromkeys(ALLOCATIONS, 0)
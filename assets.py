@@ -0,0 +1,128 @@
+"""
+    Fonts, images and rendered text, each loaded once and shared by everything that draws.  Looking up a system font
+    scans the fonts installed on the machine and loading a font or image reads and decodes a file, which is too slow to
+    do every frame or every time a new game is made.  prewarm() does the slow parts in a background thread while the
+    menu is shown, and anything asked for before it's done waits for the load that is already running instead of
+    starting another one.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+from allocations import allocations
+
+ASSET_DIRECTORY = 'assets'
+BACKGROUND_IMAGE = 'abstract_pixel_rain_background.jpg'
+FONT_NAME = 'comicsans'
+
+
+class AssetManager:
+    """
+        Caches fonts by name and size, images by file name and scaled size, and rendered text by font, text and
+        color.  A font name of None is pygame's default font.  Images are converted to the display's pixel format when
+        they're asked for after a display mode is set.  Only the last max_texts rendered texts are kept.
+    """
+    def __init__(self, directory=ASSET_DIRECTORY, max_texts=256):
+        self.directory = directory
+        self.max_texts = max_texts
+        self.font_paths = {}
+        self.fonts = {}
+        self.loaded_images = {}
+        self.images = {}
+        self.texts = OrderedDict()
+        # Loads started by prewarm() that haven't been picked up yet, by font name or image file name.
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def prewarm(self, fonts=(), images=()):
+        """
+            Find the files of the named system fonts, and load and scale the images, in a background thread.  images
+            holds (file name, size) pairs, with a size of None for an image that isn't scaled.  Only the file work and
+            the scaling are done there.  The fonts and converted surfaces are made on the thread that asks for them,
+            since pygame's font and display functions aren't safe to call from more than one thread at once.
+        """
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='assets')
+        with self.lock:
+            for name in fonts:
+                if name is not None and name not in self.font_paths and ('font', name) not in self.pending:
+                    self.pending[('font', name)] = self.executor.submit(pygame.font.match_font, name)
+            for filename, size in images:
+                key = ('image', filename, size)
+                if (filename, size) not in self.images and key not in self.pending:
+                    self.pending[key] = self.executor.submit(self.load_image, filename, size)
+
+    def take_pending(self, key):
+        # The result of a prewarmed load, waiting for it if it's still running, or None when it wasn't prewarmed.
+        with self.lock:
+            future = self.pending.pop(key, None)
+        return None if future is None else future.result()
+
+    def load_image(self, filename, size=None):
+        # The image as it was loaded, scaled to size when one is given.  Each file is only read once.
+        loaded = self.loaded_images.get(filename)
+        if loaded is None:
+            loaded = self.loaded_images[filename] = pygame.image.load(os.path.join(self.directory, filename))
+            allocations['surfaces'] += 1
+        if size is None:
+            return loaded
+        allocations['surfaces'] += 1
+        return pygame.transform.scale(loaded, size)
+
+    def font_path(self, name):
+        if name is None:
+            return None
+        if name not in self.font_paths:
+            path = self.take_pending(('font', name))
+            self.font_paths[name] = path if path is not None else pygame.font.match_font(name)
+        return self.font_paths[name]
+
+    def font(self, name, size):
+        key = (name, size)
+        font = self.fonts.get(key)
+        if font is None:
+            # A name that isn't installed falls back to the default font, the same way pygame.font.SysFont() does.
+            font = self.fonts[key] = pygame.font.Font(self.font_path(name), size)
+        return font
+
+    def image(self, filename, size=None):
+        """
+            The image in the display's pixel format, scaled to size when one is given.  Each size is only scaled and
+            converted once.  Scaling before converting means only the pixels that are drawn are converted.
+        """
+        key = (filename, size)
+        image = self.images.get(key)
+        if image is not None:
+            return image
+
+        image = self.take_pending(('image', filename, size))
+        if image is None:
+            image = self.load_image(filename, size)
+        if pygame.display.get_surface() is not None:
+            # Only images with transparency keep an alpha channel, so opaque ones are blitted as a plain copy.
+            image = image.convert_alpha() if image.get_flags() & pygame.SRCALPHA else image.convert()
+            allocations['surfaces'] += 1
+        self.images[key] = image
+        return image
+
+    def text(self, text, name, size, color, antialias=True):
+        # Render text once for each font, color and string and reuse it while it's one of the last max_texts drawn.
+        key = (text, name, size, color, antialias)
+        surface = self.texts.get(key)
+        if surface is None:
+            surface = self.texts[key] = self.font(name, size).render(text, antialias, color)
+            allocations['surfaces'] += 1
+            if len(self.texts) > self.max_texts:
+                self.texts.popitem(last=False)
+        else:
+            self.texts.move_to_end(key)
+        return surface
+
+
+# The asset manager shared by the whole game.
+assets = AssetManager()
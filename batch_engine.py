@@ -0,0 +1,196 @@
+"""
+    Runs many games at once for evaluating bots and piece sequences at scale.  Every game's board is a slice of one
+    NumPy array and each rule in engine.py is applied to all games together with vectorized operations.  Scoring and
+    losing follow the same rules as GameEngine.
+"""
+
+import numpy as np
+
+from piece_generator import PieceGenerator
+from shapes import SHAPES, ROTATIONS
+
+# Action codes accepted by BatchEngine.step().
+NO_ACTION = 0
+LEFT = 1
+RIGHT = 2
+ROTATE = 3
+
+
+def build_offset_tables():
+    """
+        Convert the rotation table into arrays indexed by [shape index, orientation, cell] so the cells of every game's
+        active tetromino can be looked up in one indexing operation.
+    """
+    offset_rows = np.zeros((len(SHAPES), 4, 4), dtype=np.int64)
+    offset_columns = np.zeros((len(SHAPES), 4, 4), dtype=np.int64)
+    for shape_index, shape in enumerate(SHAPES):
+        for orientation, (cells, _) in enumerate(ROTATIONS[shape]):
+            for cell_index, (column, row) in enumerate(cells):
+                offset_rows[shape_index, orientation, cell_index] = row
+                offset_columns[shape_index, orientation, cell_index] = column
+    spawn_heights = np.array([ROTATIONS[shape][0][1][1] for shape in SHAPES], dtype=np.int64)
+    return offset_rows, offset_columns, spawn_heights
+
+
+OFFSET_ROWS, OFFSET_COLUMNS, SPAWN_HEIGHTS = build_offset_tables()
+O_SHAPE = SHAPES.index('O')
+
+
+class BatchEngine:
+    def __init__(self, count, rows=13, columns=10, seeds=None, queue_size=3, randomizer='random',
+                 sequence_length=1024):
+        self.count = count
+        self.rows = rows
+        self.columns = columns
+        self.game_index = np.arange(count)
+
+        # Each game has its own piece generator, seeded from seeds, so game n plays the same sequence as a GameEngine
+        # with seeds[n].  Pieces are pre-generated into one (count, sequence_length) array and read with a per-game
+        # position so spawning pieces for many games is a single indexing operation.
+        seeds = [None] * count if seeds is None else list(seeds)
+        self.generators = [PieceGenerator(seed, randomizer, sequence_length) for seed in seeds]
+        self.sequences = np.zeros((count, sequence_length), dtype=np.uint8)
+        for game, generator in enumerate(self.generators):
+            self.sequences[game] = self.draw_sequence(generator)
+        self.sequence_position = np.zeros(count, dtype=np.int64)
+
+        # boards[game, row, column] holds the color index of the cell the same way Board.colors does, with zero for
+        # an empty cell.
+        self.boards = np.zeros((count, rows, columns), dtype=np.uint8)
+
+        self.score = np.zeros(count, dtype=np.int64)
+        self.lines = np.zeros(count, dtype=np.int64)
+        self.pieces = np.zeros(count, dtype=np.int64)
+        self.lost = np.zeros(count, dtype=bool)
+
+        # The active tetromino of every game as a shape index into SHAPES, an orientation and the row and column of
+        # the top left corner of its bounding box.
+        self.spawn_column = columns // 2 - 1
+        self.shape = self.next_shapes(self.game_index)
+        self.queue = np.stack([self.next_shapes(self.game_index) for _ in range(queue_size)], axis=1)
+        self.orientation = np.zeros(count, dtype=np.int64)
+        self.row = -SPAWN_HEIGHTS[self.shape]
+        self.column = np.full(count, self.spawn_column, dtype=np.int64)
+
+    def draw_sequence(self, generator):
+        return np.frombuffer(generator.take(self.sequences.shape[1]), dtype=np.uint8)
+
+    def next_shapes(self, games):
+        # One new shape index for each of the given games.  Games that reached the end of their pre-generated pieces
+        # get the next part of their sequence first.
+        exhausted = games[self.sequence_position[games] == self.sequences.shape[1]]
+        for game in exhausted:
+            self.sequences[game] = self.draw_sequence(self.generators[game])
+            self.sequence_position[game] = 0
+        shapes = self.sequences[games, self.sequence_position[games]].astype(np.int64)
+        self.sequence_position[games] += 1
+        return shapes
+
+    def cells(self, row=None, column=None, orientation=None):
+        """
+            Returns two (count, 4) arrays with the rows and columns of every game's active tetromino, or of the poses
+            given by any of the arguments.
+        """
+        row = self.row if row is None else row
+        column = self.column if column is None else column
+        orientation = self.orientation if orientation is None else orientation
+        return (row[:, None] + OFFSET_ROWS[self.shape, orientation],
+                column[:, None] + OFFSET_COLUMNS[self.shape, orientation])
+
+    def collides(self, cell_rows, cell_columns):
+        # Same rules as Board.collides.  Cells past the sides or bottom collide and cells above the top row are free.
+        outside = (cell_columns < 0) | (cell_columns >= self.columns) | (cell_rows >= self.rows)
+        occupied = self.boards[self.game_index[:, None],
+                               np.clip(cell_rows, 0, self.rows - 1),
+                               np.clip(cell_columns, 0, self.columns - 1)] != 0
+        return (outside | ((cell_rows >= 0) & occupied)).any(axis=1)
+
+    def move(self, column_changes):
+        # Move each game's tetromino by its column change.  Returns which games moved.
+        column_changes = np.broadcast_to(np.asarray(column_changes, dtype=np.int64), (self.count,))
+        candidate = self.column + column_changes
+        moved = ~self.lost & (column_changes != 0) & ~self.collides(*self.cells(column=candidate))
+        self.column = np.where(moved, candidate, self.column)
+        return moved
+
+    def rotate(self, mask=None, counterclockwise=True):
+        # Rotate the tetromino of every game selected by mask.  Returns which games rotated.
+        selected = ~self.lost & (self.shape != O_SHAPE)
+        if mask is not None:
+            selected &= mask
+        candidate = (self.orientation + (1 if counterclockwise else -1)) % 4
+        rotated = selected & ~self.collides(*self.cells(orientation=candidate))
+        self.orientation = np.where(rotated, candidate, self.orientation)
+        return rotated
+
+    def drop(self, mask=None):
+        """
+            Move the tetromino of every game selected by mask down one row.  Tetrominos that can't move down are
+            locked, or lose the game when part of them is still above the board.  Returns which games moved.
+        """
+        selected = ~self.lost
+        if mask is not None:
+            selected &= mask
+        blocked = self.collides(*self.cells(row=self.row + 1))
+
+        moved = selected & ~blocked
+        self.row = np.where(moved, self.row + 1, self.row)
+
+        landed = selected & blocked
+        self.lost |= landed & (self.row < 0)
+        locking = landed & (self.row >= 0)
+        if locking.any():
+            self.lock(np.flatnonzero(locking))
+        return moved
+
+    def lock(self, games):
+        cell_rows, cell_columns = self.cells()
+        self.boards[games[:, None], cell_rows[games], cell_columns[games]] = self.shape[games, None] + 1
+        self.pieces[games] += 1
+        self.clear_lines(games, cell_rows[games])
+        self.spawn(games)
+
+    def clear_lines(self, games, rows=None):
+        """
+            Remove the full rows of the given games and compact the rows above them.  A stable sort that puts the full
+            rows first keeps every other row in order and moves it down past the cleared rows, which are then emptied.
+            When rows holds the rows each game's tetromino was just locked in, only those rows are checked.
+        """
+        boards = self.boards[games]
+        if rows is None:
+            full = (boards != 0).all(axis=2)
+        else:
+            selected = np.arange(len(games))[:, None]
+            full = np.zeros((len(games), self.rows), dtype=bool)
+            full[selected, rows] = (boards[selected, rows] != 0).all(axis=2)
+        counts = full.sum(axis=1)
+        clearing = counts > 0
+        if clearing.any():
+            games = games[clearing]
+            counts = counts[clearing]
+            order = np.argsort(~full[clearing], axis=1, kind='stable')
+            boards = np.take_along_axis(boards[clearing], order[:, :, None], axis=1)
+            boards[np.arange(self.rows)[None, :] < counts[:, None]] = 0
+            self.boards[games] = boards
+
+            # Every cleared block is worth 10 points.
+            self.score[games] += 10 * self.columns * counts
+            self.lines[games] += counts
+
+    def spawn(self, games):
+        self.shape[games] = self.queue[games, 0]
+        self.queue[games, :-1] = self.queue[games, 1:]
+        self.queue[games, -1] = self.next_shapes(games)
+        self.orientation[games] = 0
+        self.row[games] = -SPAWN_HEIGHTS[self.shape[games]]
+        self.column[games] = self.spawn_column
+
+    def step(self, actions, gravity=True):
+        """
+            Apply one action code per game and then, when gravity is on, drop every game's tetromino one row.
+        """
+        actions = np.asarray(actions)
+        self.move((actions == RIGHT).astype(np.int64) - (actions == LEFT))
+        self.rotate(actions == ROTATE)
+        if gravity:
+            self.drop()
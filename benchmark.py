@@ -0,0 +1,271 @@
+"""
+    Benchmark suite for the game's core operations.  Every workload is timed the same way on every run and the results
+    are written as JSON or CSV so two versions of the game can be compared.  The SDL dummy video driver is used unless
+    another one is set, so the suite runs on machines without a display.
+
+        python benchmark.py --output results.json
+        python benchmark.py --output new.json --baseline results.json
+"""
+
+import os
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import argparse
+import csv
+import json
+import sys
+import time
+from collections import namedtuple
+
+import pygame
+
+from game import Game
+from placement import drop_placements, best_placement
+from results import percentile, write_json
+from shapes import SHAPES, ROTATIONS
+from tetromino import Tetromino, pool
+
+# A workload times run(state) number times in a row after each call to setup(), repeat times over.  Workloads that
+# change their state so it can't be run again use a number of one.
+Workload = namedtuple('Workload', ['name', 'setup', 'run', 'number', 'repeat'])
+BenchmarkResult = namedtuple('BenchmarkResult', ['name', 'unit', 'mean', 'median', 'minimum', 'p95', 'samples'])
+
+RESOLUTIONS = ((800, 600), (1920, 1080))
+SETTLED_PIECES = (0, 10, 25, 50)
+# Board sizes in rows and columns for the scaling workloads, which all run at 1920x1080.
+BOARD_SIZES = ((13, 10), (20, 10), (20, 20), (40, 20))
+
+
+def new_game(resolution=(800, 600), seed=0, rows=13, columns=10):
+    window = pygame.display.set_mode(resolution)
+    return Game(window, seed=seed, rows=rows, columns=columns)
+
+
+def settle_pieces(game, count, lookahead=3):
+    """
+        Lock count tetrominos onto the board through the game's own drop and lock path.  Each one is moved to the
+        placement the bot in placement.py picks looking ahead over lookahead queued tetrominos, so lines are cleared
+        and the stack stays low the way it would in play.
+    """
+    engine = game.engine
+    while engine.pieces < count and not engine.lost:
+        placement = best_placement(engine.board.row_masks, [engine.active_shape] + list(engine.queue)[:lookahead],
+                                   engine.board.columns)
+        # When every placement loses, the tetromino is dropped where it spawned and the game is lost.
+        if placement is not None:
+            engine.orientation = placement.orientation
+            engine.column = placement.column
+            game.sync_active_tetromino()
+        pieces = engine.pieces
+        while engine.pieces == pieces and not engine.lost:
+            game.move_down_active_tetromino(0)
+    return game
+
+
+def place_tetromino(game, shape, orientation, row, column):
+    # Put a tetromino straight onto the board at a cell, the same way a lock leaves it.
+    cells, _ = ROTATIONS[shape][orientation]
+    for cell_column, cell_row in cells:
+        game.board.place(row + cell_row, column + cell_column, SHAPES.index(shape) + 1)
+
+
+def line_clear_setup(lines, resolution=(800, 600), rows=13, columns=10):
+    """
+        A game where dropping a vertical 'I' into the last column clears the given number of rows.  The bottom rows
+        are filled with horizontal 'I' tetrominos and the columns left over before the last one with vertical 'I'
+        tetrominos.  Returns the game with the 'I' resting in the last column, so the next gravity step locks it, clears
+        the rows and runs full_row_handler().
+    """
+    game = new_game(resolution, rows=rows, columns=columns)
+    bottom = game.board.rows - 1
+    horizontal_columns = (columns - 1) // 4 * 4
+    for row in range(bottom, bottom - lines, -1):
+        for column in range(0, horizontal_columns, 4):
+            place_tetromino(game, 'I', 1, row, column)
+    for column in range(horizontal_columns, columns - 1):
+        place_tetromino(game, 'I', 0, bottom - 3, column)
+
+    engine = game.engine
+    game.active_tetromino.add(game.create_tetromino('I'))
+    engine.active_shape = 'I'
+    engine.orientation = 0
+    engine.row = bottom - 3
+    engine.column = game.board.columns - 1
+    game.sync_active_tetromino()
+    assert engine.landing_row() == engine.row
+    return game
+
+
+def clear_lines(game):
+    # A gravity step that locks the tetromino of line_clear_setup(), timed through the clear and full_row_handler().
+    game.move_down_active_tetromino(0)
+
+
+def collision_setup(pieces):
+    # A game with pieces locked and the active tetromino resting on the stack.
+    game = settle_pieces(new_game(), pieces)
+    engine = game.engine
+    placement = drop_placements(engine.board.row_masks, engine.active_shape, engine.board.columns)[0]
+    engine.orientation, engine.row, engine.column = placement.orientation, placement.row, placement.column
+    game.sync_active_tetromino()
+    return game
+
+
+def check_collisions(game):
+    # The check gravity makes, which finds the active tetromino blocked by the stack.
+    engine = game.engine
+    return game.board.collides(engine.active_cells(row=engine.row + 1))
+
+
+def draw_setup(resolution, rows=13, columns=10, pieces=10):
+    # A game at the resolution with settled pieces and every cached surface already built.
+    game = settle_pieces(new_game(resolution, rows=rows, columns=columns), pieces)
+    game.draw()
+    return game
+
+
+def lock_setup(resolution, rows, columns):
+    # A game with its board about a third full and the active tetromino resting on the stack, so the next gravity
+    # step locks it.
+    game = settle_pieces(new_game(resolution, rows=rows, columns=columns), rows * columns // 12)
+    engine = game.engine
+    placement = best_placement(engine.board.row_masks, [engine.active_shape], columns)
+    engine.orientation, engine.row, engine.column = placement.orientation, placement.row, placement.column
+    game.sync_active_tetromino()
+    return game
+
+
+def build_workloads(repeat):
+    workloads = []
+    for shape in SHAPES:
+        workloads.append(Workload(f'tetromino_construction/{shape}', lambda: None,
+                                  lambda state, shape=shape: Tetromino(shape, 100, 200, 32), 100, repeat))
+    for shape in SHAPES:
+        # A spawn and lock through the pool, which resets a recycled tetromino instead of building one.
+        workloads.append(Workload(f'tetromino_pool/{shape}', lambda: None,
+                                  lambda state, shape=shape: pool.release(pool.acquire(shape, 100, 200, 32)), 100,
+                                  repeat))
+    for shape in SHAPES:
+        workloads.append(Workload(f'rotate/{shape}', lambda shape=shape: Tetromino(shape, 100, 200, 32),
+                                  lambda tetromino: tetromino.rotate(), 400, repeat))
+    workloads.append(Workload('move', lambda: Tetromino('T', 100, 200, 32),
+                              lambda tetromino: tetromino.move(0, 1), 1000, repeat))
+
+    for pieces in SETTLED_PIECES:
+        workloads.append(Workload(f'collision_check/pieces={pieces}', lambda pieces=pieces: collision_setup(pieces),
+                                  check_collisions, 20, max(5, repeat // 4)))
+    for pieces in SETTLED_PIECES:
+        # The ghost's landing row, found again every time the active tetromino moves.
+        workloads.append(Workload(f'landing_row/pieces={pieces}', lambda pieces=pieces: collision_setup(pieces),
+                                  lambda game: game.engine.landing_row(), 20, max(5, repeat // 4)))
+
+    for lines in range(1, 5):
+        workloads.append(Workload(f'line_clear/lines={lines}', lambda lines=lines: line_clear_setup(lines),
+                                  clear_lines, 1, repeat))
+
+    # The same work on boards of growing size.  The window stays the same so the board's cells get smaller and the
+    # time of each workload should stay about the same.
+    for rows, columns in BOARD_SIZES:
+        size = f'{rows}x{columns}'
+        workloads.append(Workload(f'board_scaling/frame/{size}',
+                                  lambda rows=rows, columns=columns:
+                                  draw_setup((1920, 1080), rows, columns, rows * columns // 12),
+                                  lambda game: game.draw(), 10, max(5, repeat // 4)))
+        workloads.append(Workload(f'board_scaling/lock/{size}',
+                                  lambda rows=rows, columns=columns: lock_setup((1920, 1080), rows, columns),
+                                  lambda game: game.move_down_active_tetromino(0), 1, max(5, repeat // 4)))
+        workloads.append(Workload(f'board_scaling/line_clear/{size}',
+                                  lambda rows=rows, columns=columns: line_clear_setup(4, (1920, 1080), rows, columns),
+                                  clear_lines, 1, repeat))
+        workloads.append(Workload(f'board_scaling/collision_check/{size}',
+                                  lambda rows=rows, columns=columns: lock_setup((1920, 1080), rows, columns),
+                                  check_collisions, 20, max(5, repeat // 4)))
+
+    for width, height in RESOLUTIONS:
+        workloads.append(Workload(f'draw_game_window/{width}x{height}', lambda size=(width, height): draw_setup(size),
+                                  lambda game: game.draw_game_window(), 10, max(5, repeat // 4)))
+        workloads.append(Workload(f'frame/{width}x{height}', lambda size=(width, height): draw_setup(size),
+                                  lambda game: game.draw(), 10, max(5, repeat // 4)))
+    return workloads
+
+
+def run_workload(workload):
+    # Per call times in microseconds, one for each repeat.
+    samples = []
+    for _ in range(workload.repeat):
+        state = workload.setup()
+        start = time.perf_counter()
+        for _ in range(workload.number):
+            workload.run(state)
+        samples.append((time.perf_counter() - start) / workload.number * 1e6)
+    return BenchmarkResult(workload.name, 'us', sum(samples) / len(samples), percentile(samples, 50), min(samples),
+                           percentile(samples, 95), len(samples))
+
+
+def run_benchmarks(workloads, pattern=None):
+    for workload in workloads:
+        if pattern is None or pattern in workload.name:
+            yield run_workload(workload)
+
+
+def write_results(results, path):
+    # A path ending in .csv gets one row per workload, anything else gets JSON with the run's metadata.
+    if path is not None and path.endswith('.csv'):
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(BenchmarkResult._fields)
+            writer.writerows(results)
+        return
+
+    write_json(results, path)
+
+
+def compare(results, baseline_path, threshold):
+    """
+        Print how the median of every workload changed against a baseline JSON file.  Returns the names of the
+        workloads that got slower by more than the threshold ratio.
+    """
+    with open(baseline_path) as file:
+        baseline = {result['name']: result for result in json.load(file)['results']}
+    regressions = []
+    for result in results:
+        if result.name not in baseline:
+            continue
+        ratio = result.median / baseline[result.name]['median']
+        flag = ''
+        if ratio > threshold:
+            regressions.append(result.name)
+            flag = '  REGRESSION'
+        print(f"{result.name:45} {baseline[result.name]['median']:10.1f} -> {result.median:10.1f} us  "
+              f"x{ratio:.2f}{flag}", file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the game's core operations.")
+    parser.add_argument('--output', default=None, help='.json or .csv file, JSON to stdout when not given')
+    parser.add_argument('--repeat', type=int, default=40)
+    parser.add_argument('--filter', default=None, help='only run workloads with this in their name')
+    parser.add_argument('--baseline', default=None, help='JSON results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='slowdown ratio against the baseline that counts as a regression')
+    arguments = parser.parse_args()
+
+    # Game loads its assets from paths relative to the project folder.
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    pygame.init()
+
+    results = []
+    for result in run_benchmarks(build_workloads(arguments.repeat), arguments.filter):
+        print(f"{result.name:45} median {result.median:10.1f} us  p95 {result.p95:10.1f} us", file=sys.stderr)
+        results.append(result)
+    write_results(results, arguments.output)
+
+    if arguments.baseline is not None and compare(results, arguments.baseline, arguments.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
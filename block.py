@@ -1,14 +1,16 @@
 import pygame
 
+from block_atlas import get_atlas
+from allocations import allocations
+
 
 class Block(pygame.sprite.Sprite):
     def __init__(self, tetromino, size, color, x, y):
         super().__init__()
+        allocations['blocks'] += 1
         self.tetromino = tetromino
-        self.image = pygame.Surface((size, size))
-        self.image.fill(color)
-        # Create a black outline around the block.
-        pygame.draw.rect(self.image, 'black', self.image.get_rect(), 1)
-        self.rect = self.image.get_rect(topleft=(x, y))
+        # Every block of a color shares the same pre-rendered tile from the atlas instead of owning a surface.
+        self.image = get_atlas(size).tile(color)
+        self.rect = pygame.Rect(x, y, size, size)
         self.screen_x_pos = x
         self.screen_y_pos = y
@@ -0,0 +1,64 @@
+"""
+    Pre-rendered block tiles.  An atlas holds one tile for every tetromino color at one block size.  Blocks share the
+    tiles instead of each owning a surface, and every block on the play area is drawn from the atlas with a single
+    Surface.blits() call.  A second strip of outlined tiles is used to draw the ghost of the active tetromino.
+"""
+
+import pygame
+
+from allocations import allocations
+from shapes import SHAPES, COLORS, GARBAGE_COLOR
+
+# One atlas for each block size in use, built the first time a block of that size is created.
+atlases = {}
+
+
+class BlockAtlas:
+    def __init__(self, block_size):
+        self.block_size = block_size
+        # A tile for each shape's color followed by one for garbage rows.
+        colors = [COLORS[shape] for shape in SHAPES] + [GARBAGE_COLOR]
+        self.surface = pygame.Surface((block_size * len(colors), block_size))
+        for index, color in enumerate(colors):
+            tile_rect = pygame.Rect(index * block_size, 0, block_size, block_size)
+            self.surface.fill(color, tile_rect)
+            # Create a black outline around the block.
+            pygame.draw.rect(self.surface, 'black', tile_rect, 1)
+
+        # Converting the atlas to the display's pixel format once makes every blit from it a plain copy.  This can
+        # only be done after a display mode is set.
+        if pygame.display.get_surface() is not None:
+            self.surface = self.surface.convert()
+            allocations['surfaces'] += 1
+
+        # Ghost tiles are only an outline in the tetromino's color.  They are kept on their own surface since the black
+        # inside them is made transparent with a color key, which would also hide the outline of the solid tiles.
+        self.ghost_surface = pygame.Surface((block_size * len(SHAPES), block_size))
+        for index, shape in enumerate(SHAPES):
+            pygame.draw.rect(self.ghost_surface, COLORS[shape], (index * block_size, 0, block_size, block_size),
+                             max(1, block_size // 10))
+        if pygame.display.get_surface() is not None:
+            self.ghost_surface = self.ghost_surface.convert()
+            allocations['surfaces'] += 1
+        self.ghost_surface.set_colorkey('black')
+        allocations['surfaces'] += 2
+
+        # The tiles are subsurfaces so they share the atlas's pixels.
+        self.tiles = {color: self.surface.subsurface((index * block_size, 0, block_size, block_size))
+                      for index, color in enumerate(colors)}
+
+        # The same tiles indexed by the color index the board stores, which is zero for an empty cell.
+        self.color_tiles = (None,) + tuple(self.tiles[color] for color in colors)
+        self.ghost_tiles = (None,) + tuple(self.ghost_surface.subsurface((index * block_size, 0, block_size,
+                                                                          block_size))
+                                           for index in range(len(SHAPES)))
+
+    def tile(self, color):
+        return self.tiles[color]
+
+
+def get_atlas(block_size):
+    atlas = atlases.get(block_size)
+    if atlas is None:
+        atlas = atlases[block_size] = BlockAtlas(block_size)
+    return atlas
@@ -0,0 +1,124 @@
+class Board:
+    """
+        Compact occupancy core for the play area.  Each row is stored as one integer bitmask where bit n is set when
+        column n is occupied.  The color and owner of every cell are kept in flat arrays that run parallel to the
+        bitmasks and are indexed by row * columns + column.  A color of zero means the cell is empty.
+    """
+    def __init__(self, rows, columns):
+        self.rows = rows
+        self.columns = columns
+
+        # A row is full when every column bit is set.  Comparing a row's bitmask against this value replaces counting
+        # the occupied cells of the row one at a time.
+        self.full_row_mask = (1 << columns) - 1
+
+        self.row_masks = [0] * rows
+        # The number of occupied cells in each row, kept up to date as cells are placed and rows are cleared.
+        self.row_fill = [0] * rows
+        # The row of the highest occupied cell in each column, or the number of rows for an empty column.  A tetromino
+        # above the top of every column it covers lands on the highest of those tops, so its landing row comes from
+        # this index without stepping it down and checking for a collision at every row.
+        self.column_tops = [rows] * columns
+        self.colors = bytearray(rows * columns)
+        self.owners = [None] * (rows * columns)
+
+    def in_bounds(self, row, column):
+        return 0 <= row < self.rows and 0 <= column < self.columns
+
+    def is_occupied(self, row, column):
+        return self.row_masks[row] >> column & 1 == 1
+
+    def color(self, row, column):
+        return self.colors[row * self.columns + column]
+
+    def owner(self, row, column):
+        return self.owners[row * self.columns + column]
+
+    def row_owners(self, row):
+        start = row * self.columns
+        return self.owners[start:start + self.columns]
+
+    def collides(self, cells):
+        """
+            Check a set of (row, column) cells against the board.  Cells outside the sides or below the bottom of the
+            board count as a collision.  Cells above the top row are free since tetrominos enter the play area from
+            above.
+        """
+        for row, column in cells:
+            if column < 0 or column >= self.columns or row >= self.rows:
+                return True
+            if row >= 0 and self.row_masks[row] >> column & 1:
+                return True
+        return False
+
+    def place(self, row, column, color, owner=None):
+        if not self.row_masks[row] >> column & 1:
+            self.row_fill[row] += 1
+        if row < self.column_tops[column]:
+            self.column_tops[column] = row
+        self.row_masks[row] |= 1 << column
+        self.colors[row * self.columns + column] = color
+        self.owners[row * self.columns + column] = owner
+
+    def full_rows(self, rows=None):
+        """
+            Returns the full rows in order from the top.  Only the given rows are checked when rows is passed, such as
+            the rows a tetromino was just placed in, since no other row can have become full.
+        """
+        if rows is None:
+            rows = range(self.rows)
+        return [row for row in sorted(set(rows)) if self.row_fill[row] == self.columns]
+
+    def clear_rows(self, rows):
+        """
+            Remove the given rows and shift every row above them down to fill the gap.  Working from the top row down,
+            deleting a row and inserting an empty one at the top leaves the index of every row below it unchanged, so
+            the remaining rows in the list still point at the correct rows.
+        """
+        empty_colors = bytes(self.columns)
+        empty_owners = [None] * self.columns
+        for row in sorted(rows):
+            start = row * self.columns
+            del self.row_masks[row]
+            self.row_masks.insert(0, 0)
+            del self.row_fill[row]
+            self.row_fill.insert(0, 0)
+            del self.colors[start:start + self.columns]
+            self.colors[0:0] = empty_colors
+            del self.owners[start:start + self.columns]
+            self.owners[0:0] = empty_owners
+        self.update_column_tops()
+
+    def add_garbage(self, lines, hole, color):
+        """
+            Push every row up by lines and fill the bottom with rows that are full except for the hole column.  Returns
+            True when an occupied cell was pushed off the top of the board.
+        """
+        lines = min(lines, self.rows)
+        overflow = any(self.row_masks[:lines])
+        garbage_colors = bytes(0 if column == hole else color for column in range(self.columns))
+        del self.row_masks[:lines]
+        self.row_masks.extend([self.full_row_mask & ~(1 << hole)] * lines)
+        del self.row_fill[:lines]
+        self.row_fill.extend([self.columns - 1] * lines)
+        del self.colors[:lines * self.columns]
+        self.colors.extend(garbage_colors * lines)
+        del self.owners[:lines * self.columns]
+        self.owners.extend([None] * (lines * self.columns))
+        self.update_column_tops()
+        return overflow
+
+    def update_column_tops(self):
+        # Find the top of every column again by going down the rows until every column has been seen.
+        tops = [self.rows] * self.columns
+        remaining = self.full_row_mask
+        for row, mask in enumerate(self.row_masks):
+            found = mask & remaining
+            while found:
+                bit = found & -found
+                tops[bit.bit_length() - 1] = row
+                found ^= bit
+            remaining &= ~mask
+            if not remaining:
+                break
+        self.column_tops = tops
@@ -6,15 +6,152 @@
 '''
 
 
+import contextlib
+import csv
+import json
+import time
+from collections import deque
+
 import pygame
 
-pygame.init()
-font = pygame.font.Font(None, 30)
+from allocations import ALLOCATIONS, allocations
+from assets import assets
+from results import percentile
 
 
 def debug(info, y=10, x=10):
     display_surf = pygame.display.get_surface()
-    debug_surf = font.render(str(info), True, 'White')
+    # The font is loaded the first time it's used rather than when this module is imported.
+    debug_surf = assets.font(None, 30).render(str(info), True, 'White')
     debug_rect = debug_surf.get_rect(topleft=(x, y))
     pygame.draw.rect(display_surf, 'Black', debug_rect)
     display_surf.blit(debug_surf, debug_rect)
+
+
+# Latencies recorded with Profiler.latency().  The input latency is from a key press being read to the window being
+# updated with its move and the round trip is to the versus server and back.
+LATENCIES = ('input_latency', 'round_trip')
+
+
+class ProfilerSection:
+    # Times one named section of a frame.  Sections are reused every frame so timing a section allocates nothing.
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        frame = self.profiler.current_frame
+        frame[self.name] = frame.get(self.name, 0.0) + (time.perf_counter() - self.start) * 1000
+        return False
+
+
+class Profiler:
+    """
+        Rolling per-frame timings of named sections of the game loop, the frame time, the time clock.tick() spent
+        waiting, the latencies in LATENCIES and the number of each of the ALLOCATIONS made.  Sections are timed with
+        'with profiler.section(name):' and a section entered more than once in a frame adds up.  end_frame() closes
+        the frame and keeps the last window frames for the overlay and up to history frames for export.  A disabled
+        profiler hands out a section that does nothing.
+    """
+    def __init__(self, enabled=True, window=120, history=36000):
+        self.enabled = enabled
+        self.visible = False
+        self.sections = {}
+        self.null_section = contextlib.nullcontext()
+        self.current_frame = {}
+        self.frames = deque(maxlen=window)
+        self.history = deque(maxlen=history)
+        self.section_names = []
+        # The allocation counts at the end of the last frame.
+        self.allocated = dict(allocations)
+
+    def section(self, name):
+        if not self.enabled:
+            return self.null_section
+        section = self.sections.get(name)
+        if section is None:
+            section = self.sections[name] = ProfilerSection(self, name)
+            self.section_names.append(name)
+        return section
+
+    def end_frame(self, frame_time, slack):
+        # frame_time is the milliseconds since the last frame and slack the part of it clock.tick() spent waiting.
+        if not self.enabled:
+            return
+        frame = self.current_frame
+        frame['frame'] = frame_time
+        frame['slack'] = slack
+        for kind in ALLOCATIONS:
+            frame[kind] = allocations[kind] - self.allocated[kind]
+        self.allocated.update(allocations)
+        self.frames.append(frame)
+        self.history.append(frame)
+        self.current_frame = {}
+
+    def latency(self, name, latency):
+        # Record a latency in milliseconds for one of the names in LATENCIES.  A frame with more than one keeps the
+        # longest.
+        if not self.enabled:
+            return
+        frame = self.current_frame
+        frame[name] = max(frame.get(name, 0.0), latency)
+
+    def toggle(self):
+        self.visible = self.enabled and not self.visible
+
+    def values(self, name, frames=None):
+        return [frame.get(name, 0.0) for frame in (self.frames if frames is None else frames)]
+
+    def summary(self, frames=None):
+        # Mean and percentiles in milliseconds of the frame time, the slack, every latency and every section.  A latency
+        # only counts the frames it was recorded in.  The allocations have their total and the most in one frame.
+        frames = self.frames if frames is None else frames
+        summary = {}
+        for name in ALLOCATIONS:
+            values = self.values(name, frames)
+            summary[name] = {'total': sum(values), 'max': max(values, default=0)}
+        for name in ['frame', 'slack'] + list(LATENCIES) + self.section_names:
+            if name in LATENCIES:
+                values = [frame[name] for frame in frames if name in frame]
+            else:
+                values = self.values(name, frames)
+            summary[name] = {'mean': sum(values) / len(values) if values else 0.0,
+                             'p50': percentile(values, 50),
+                             'p95': percentile(values, 95),
+                             'p99': percentile(values, 99)}
+        return summary
+
+    def draw(self):
+        # Show the summary of the recent frames with one debug() line per value.
+        if not self.visible:
+            return
+        summary = self.summary()
+        lines = [f"{len(self.frames)} frames  ms: mean / p50 / p95 / p99",
+                 "allocated: " + "  ".join(f"{name} {summary.pop(name)['total']}" for name in ALLOCATIONS)]
+        for name, stats in summary.items():
+            lines.append(f"{name}: {stats['mean']:.2f} / {stats['p50']:.2f} / {stats['p95']:.2f} / {stats['p99']:.2f}")
+        for index, line in enumerate(lines):
+            debug(line, 10 + index * 22)
+
+    def export(self, path):
+        """
+            Write every recorded frame to path.  A .json path gets the summary of all recorded frames followed by the
+            frames, anything else gets a CSV file with one row per frame.
+        """
+        names = ['frame', 'slack'] + list(LATENCIES) + list(ALLOCATIONS) + self.section_names
+        if path.endswith('.json'):
+            with open(path, 'w') as file:
+                json.dump({'summary': self.summary(self.history),
+                           'frames': [{name: frame.get(name, 0.0) for name in names} for frame in self.history]},
+                          file, indent=1)
+        else:
+            with open(path, 'w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(names)
+                for frame in self.history:
+                    writer.writerow([f"{frame.get(name, 0.0):.4f}" for name in names])
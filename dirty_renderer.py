@@ -0,0 +1,86 @@
+class DirtyRectRenderer:
+    """
+        Opt-in renderer that only redraws and updates the parts of the window that changed since the last frame.
+        The regions tracked are the old and new positions of the active tetromino and its ghost, where a tetromino
+        locked, the rows above a line clear, the score box and the tetromino queue panel.  Each region is redrawn with
+        the window clipped to it so everything behind it, from the background up, is drawn again in the right order.
+    """
+    def __init__(self, game):
+        self.game = game
+        self.full_redraw = True
+        # The shape, orientation and rect the active tetromino and its ghost were drawn with last frame.
+        self.previous_active_pose = None
+        self.previous_ghost_pose = None
+        self.previous_score = None
+        self.previous_queue = None
+
+    def redraw(self, rect):
+        self.game.window.set_clip(rect)
+        self.game.draw_game_window()
+        self.game.draw_blocks()
+        self.game.window.set_clip(None)
+
+    def poses(self):
+        tetromino = self.game.active_tetromino.sprite
+        return ((tetromino.shape, tetromino.orientation, tetromino.rect.copy()),
+                (tetromino.shape, tetromino.orientation, self.game.ghost_rect.copy()))
+
+    def remember_frame(self):
+        self.previous_active_pose, self.previous_ghost_pose = self.poses()
+        self.previous_score = self.game.score
+        self.previous_queue = tuple(self.game.tetromino_queue.queue)
+
+    def draw(self):
+        """
+            Draw the frame and return the list of rects that need to be passed to pygame.display.update().
+        """
+        game = self.game
+
+        # The first frame has nothing on screen to build on so the whole window is drawn.
+        if self.full_redraw:
+            self.redraw(None)
+            self.full_redraw = False
+            self.remember_frame()
+            return [game.window.get_rect()]
+
+        dirty_rects = []
+
+        # Several moves can be applied in one frame, so a tetromino rotated twice or a new tetromino of another shape
+        # can have the same rect as the one drawn last frame.  The whole pose is compared rather than only the rect.
+        # When the tetromino or its ghost only moved a cell the two rects overlap and are updated as one.  After a lock
+        # the new tetromino is at the top of the play area so the old and new rects are kept apart.
+        for pose, previous_pose in zip(self.poses(), (self.previous_active_pose, self.previous_ghost_pose)):
+            if pose != previous_pose:
+                rect, previous_rect = pose[2], previous_pose[2]
+                if rect.colliderect(previous_rect):
+                    dirty_rects.append(rect.union(previous_rect))
+                else:
+                    dirty_rects.append(previous_rect)
+                    dirty_rects.append(rect)
+
+        if game.locked_rect is not None:
+            dirty_rects.append(game.locked_rect)
+            game.locked_rect = None
+
+        if game.cleared_rows_rect is not None:
+            dirty_rects.append(game.cleared_rows_rect)
+            game.cleared_rows_rect = None
+
+        score_changed = game.score != self.previous_score
+        if score_changed:
+            # The old score box is cleared here and the new one is added below once its size is known.
+            dirty_rects.append(game.score_rect)
+
+        if tuple(game.tetromino_queue.queue) != self.previous_queue:
+            dirty_rects.append(game.queue_rect)
+
+        for rect in dirty_rects:
+            self.redraw(rect)
+
+        # The score box grows as the score gets longer so the new box can reach past the old one.
+        if score_changed and not any(rect.contains(game.score_rect) for rect in dirty_rects):
+            dirty_rects.append(game.score_rect)
+            self.redraw(game.score_rect)
+
+        self.remember_frame()
+        return dirty_rects
@@ -0,0 +1,223 @@
+"""
+    Display-free game rules.  The engine knows nothing about pygame, windows or pixels.  It works on board cells and is
+    driven by the caller, either one action or gravity step at a time or with an explicit clock and a stream of
+    actions.  The pygame front end in game.py draws whatever state the engine is in.
+"""
+
+from collections import deque
+
+from board import Board
+from piece_generator import PieceGenerator
+from shapes import SHAPES, ROTATIONS, GARBAGE
+
+# The moves a player can make.  A hard drop is also handled as an action but isn't one of the moves, so the random
+# policies in tournament.py don't drop every other tetromino.
+ACTIONS = ('left', 'right', 'rotate')
+
+
+def build_bottom_table():
+    # For every shape and orientation, each column the tetromino covers with the row of its lowest cell in it.
+    table = {}
+    for shape in SHAPES:
+        orientations = []
+        for cells, (width, height) in ROTATIONS[shape]:
+            bottoms = [0] * width
+            for column, row in cells:
+                bottoms[column] = max(bottoms[column], row)
+            orientations.append(tuple(enumerate(bottoms)))
+        table[shape] = tuple(orientations)
+    return table
+
+
+BOTTOMS = build_bottom_table()
+
+
+class GameEngine:
+    def __init__(self, rows=13, columns=10, seed=None, gravity_interval=1000, movement_cooldown=500, queue_size=3,
+                 randomizer='random', generator=None):
+        self.board = Board(rows, columns)
+        # The same seed and randomizer always give the same sequence of tetrominos.
+        self.generator = generator if generator is not None else PieceGenerator(seed, randomizer)
+
+        # Tetrominos start centered above the top row of the board.
+        self.spawn_column = columns // 2 - 1
+
+        # Times are in milliseconds and come from whatever clock the caller passes in.
+        self.gravity_interval = gravity_interval
+        self.movement_cooldown = movement_cooldown
+        self.time_of_gravity = 0
+        self.time_of_movement = None
+
+        self.score = 0
+        self.lines = 0
+        self.pieces = 0
+        self.lost = False
+
+        # Owners for the active tetromino's cells in the same order as its cells.  A front end can attach the objects
+        # that draw the cells so it can find them again on the board.
+        self.active_owners = None
+
+        # The rows cleared by the most recent lock, each with the owners of its cells from before it was cleared.
+        self.last_clear = []
+
+        # An optional replay writer that gets every accepted action and gravity step with its time.
+        self.recorder = None
+
+        # The active tetromino is picked before the queue is filled.
+        first_shape = self.next_shape()
+        self.queue = deque(self.next_shape() for _ in range(queue_size))
+        self.spawn(first_shape)
+
+    def next_shape(self):
+        return self.generator.next_shape()
+
+    def spawn(self, shape):
+        self.active_shape = shape
+        self.orientation = 0
+        _, (width, height) = ROTATIONS[shape][0]
+        # The row and column of the top left corner of the tetromino's bounding box.  Starting with the bottom of the
+        # tetromino just above the top row of the board.
+        self.row = -height
+        self.column = self.spawn_column
+        self.active_owners = None
+
+    def active_cells(self, row=None, column=None, orientation=None):
+        # The (row, column) cells of the active tetromino, or of the pose given by any of the arguments.
+        row = self.row if row is None else row
+        column = self.column if column is None else column
+        orientation = self.orientation if orientation is None else orientation
+        cells, _ = ROTATIONS[self.active_shape][orientation]
+        return [(row + cell_row, column + cell_column) for cell_column, cell_row in cells]
+
+    def move(self, column_change):
+        if self.board.collides(self.active_cells(column=self.column + column_change)):
+            return False
+        self.column += column_change
+        return True
+
+    def rotate(self, counterclockwise=True):
+        if self.active_shape == 'O':
+            return False
+        orientation = (self.orientation + (1 if counterclockwise else -1)) % 4
+        if self.board.collides(self.active_cells(orientation=orientation)):
+            return False
+        self.orientation = orientation
+        return True
+
+    def landing_row(self):
+        """
+            The row the active tetromino stops at if it falls straight down from where it is.  While it is above the top
+            of every column it covers, that's one row above where its lowest cell in some column meets the column's
+            top.  Only a tetromino that was slid under an overhang is stepped down to find where it stops.
+        """
+        tops = self.board.column_tops
+        row = self.row
+        landing = self.board.rows
+        for offset, bottom in BOTTOMS[self.active_shape][self.orientation]:
+            top = tops[self.column + offset]
+            if row + bottom >= top:
+                while not self.board.collides(self.active_cells(row=row + 1)):
+                    row += 1
+                return row
+            landing = min(landing, top - bottom - 1)
+        return landing
+
+    def hard_drop(self):
+        # Drop the active tetromino straight to its landing row and lock it there, or lose the game if it lands with
+        # part of it still above the board.
+        self.row = self.landing_row()
+        if self.row < 0:
+            self.lost = True
+        else:
+            self.lock()
+
+    def drop(self, now=None):
+        """
+            Move the active tetromino down one row.  When it can't move down it is locked onto the board, unless part
+            of it is still above the board which loses the game.  Returns True when the tetromino moved.  The time is
+            only used when recording a replay.
+        """
+        if self.lost:
+            return False
+        if self.recorder is not None:
+            self.recorder.record(now, 'gravity')
+        if not self.board.collides(self.active_cells(row=self.row + 1)):
+            self.row += 1
+            return True
+
+        if self.row < 0:
+            self.lost = True
+        else:
+            self.lock()
+        return False
+
+    def lock(self):
+        color = SHAPES.index(self.active_shape) + 1
+        owners = self.active_owners or [None] * 4
+        cells = self.active_cells()
+        for (row, column), owner in zip(cells, owners):
+            self.board.place(row, column, color, owner)
+        self.pieces += 1
+
+        # Line clears only happen here, once per lock, and only the rows the tetromino was placed in can have filled.
+        self.last_clear = []
+        full_rows = self.board.full_rows(row for row, _ in cells)
+        if full_rows:
+            self.last_clear = [(row, self.board.row_owners(row)) for row in full_rows]
+            # Every cleared block is worth 10 points.
+            self.score += 10 * self.board.columns * len(full_rows)
+            self.lines += len(full_rows)
+            self.board.clear_rows(full_rows)
+
+        self.spawn(self.queue.popleft())
+        self.queue.append(self.next_shape())
+
+    def add_garbage(self, lines, hole, now=None):
+        """
+            Push lines garbage rows with a gap at the hole column onto the bottom of the board, as sent by the opponent
+            in a versus game.  The active tetromino is pushed up with the stack if the stack now overlaps it, and the
+            game is lost if any settled cell is pushed off the top.  The time is only used when recording a replay.
+        """
+        if self.lost or lines <= 0:
+            return
+        if self.recorder is not None:
+            self.recorder.record(now, 'garbage', (lines, hole))
+        overflow = self.board.add_garbage(lines, hole, GARBAGE)
+        while self.board.collides(self.active_cells()):
+            self.row -= 1
+        if overflow:
+            self.lost = True
+
+    def handle_action(self, action, now):
+        """
+            Apply a player action at time now.  Actions made less than the movement cooldown after the last accepted
+            action are ignored.  Returns True when the action was accepted.
+        """
+        if self.lost:
+            return False
+        if self.time_of_movement is not None and now - self.time_of_movement < self.movement_cooldown:
+            return False
+
+        if action == 'left':
+            self.move(-1)
+        elif action == 'right':
+            self.move(1)
+        elif action == 'rotate':
+            self.rotate()
+        elif action == 'hard_drop':
+            self.hard_drop()
+        self.time_of_movement = now
+        if self.recorder is not None:
+            self.recorder.record(now, action)
+        return True
+
+    def update(self, now, actions=()):
+        """
+            Advance the game to time now.  The actions are applied in order at that time and then one gravity step is
+            taken for every gravity interval that has passed since the last one.
+        """
+        for action in actions:
+            self.handle_action(action, now)
+        while not self.lost and now - self.time_of_gravity >= self.gravity_interval:
+            self.time_of_gravity += self.gravity_interval
+            self.drop(self.time_of_gravity)
@@ -0,0 +1,104 @@
+"""
+    Board features for bot heuristics, computed straight from the row bitmasks used by Board.row_masks and
+    placement.py.  batch_features.py computes the same features for many boards at once with NumPy.
+
+    The features are always in the order of FEATURES, so a feature vector, a row of a batch and a set of weights can
+    be lined up by position:
+
+        aggregate_height    the sum of the column heights
+        max_height          the height of the tallest column
+        holes               empty cells with an occupied cell anywhere above them in the same column
+        bumpiness           the sum of the height differences between neighbouring columns
+        row_transitions     changes between occupied and empty cells along each row, with both walls occupied
+        column_transitions  changes between occupied and empty cells down each column, with the floor occupied
+        wells               for each column lower than both of its neighbours, with the walls as tall as the board,
+                            1 + 2 + ... up to how far it is below the lower neighbour
+"""
+
+from collections import namedtuple
+
+FEATURES = ('aggregate_height', 'max_height', 'holes', 'bumpiness', 'row_transitions', 'column_transitions', 'wells')
+BoardFeatures = namedtuple('BoardFeatures', FEATURES)
+
+# Weights in the order of FEATURES that score a board the same as placement.evaluate_surface().
+WEIGHTS = (-0.5, 0.0, -4.0, -0.3, 0.0, 0.0, 0.0)
+
+
+def board_features(board, columns):
+    """
+        The features of a board given as a sequence of row bitmasks, from the top row down.  Every feature is counted
+        a row at a time from the row's bitmask and covered, the bitmask of the columns with an occupied cell in this
+        row or any row above it, so no column is ever looked at on its own:
+
+            a column's height is the number of rows its bit is set in covered,
+            two neighbouring columns differ in height by the number of rows covered has one of their bits but not both,
+            a column is as deep in a well as the number of rows covered has both neighbours' bits but not its own.
+
+        Well cells are counted in a binary counter for each column, held as one bitmask per bit of the count, since
+        the well feature needs each column's depth rather than only their total.
+    """
+    full_row_mask = (1 << columns) - 1
+    # A row is shifted up a bit and given an occupied cell for each wall, and its transitions are the bits that differ
+    # from the bit next to them.
+    walls = 1 | 1 << columns + 1
+    transition_mask = (1 << columns + 1) - 1
+    # The pairs of neighbouring columns, by the lower column of each pair.
+    neighbours_mask = (1 << columns - 1) - 1
+    right_wall = 1 << columns - 1
+
+    aggregate_height = 0
+    max_height = 0
+    holes = 0
+    bumpiness = 0
+    row_transitions = 0
+    column_transitions = 0
+    covered = 0
+    previous = 0
+    depths = [0] * len(board).bit_length()
+    for mask in board:
+        holes += (covered & ~mask).bit_count()
+        covered |= mask
+        if covered:
+            aggregate_height += covered.bit_count()
+            max_height += 1
+            bumpiness += ((covered ^ covered >> 1) & neighbours_mask).bit_count()
+        padded = mask << 1 | walls
+        row_transitions += ((padded ^ padded >> 1) & transition_mask).bit_count()
+        column_transitions += (previous ^ mask).bit_count()
+        previous = mask
+
+        # Add one to the depth of every column this row is a well cell of.
+        carry = (full_row_mask ^ covered) & (covered << 1 | 1) & (covered >> 1 | right_wall)
+        bit = 0
+        while carry:
+            depth = depths[bit]
+            depths[bit] = depth ^ carry
+            carry &= depth
+            bit += 1
+    column_transitions += (previous ^ full_row_mask).bit_count()
+
+    # The sum of d * (d + 1) / 2 over the depths d, from the sums of d and of d squared.  Squaring a depth multiplies
+    # its bits pairwise, so both sums come from counting the columns each bit, or each pair of bits, is set in.
+    wells = 0
+    for bit, depth in enumerate(depths):
+        if depth:
+            wells += depth.bit_count() << bit
+            for other_bit, other_depth in enumerate(depths):
+                wells += (depth & other_depth).bit_count() << bit + other_bit
+
+    return BoardFeatures(aggregate_height, max_height, holes, bumpiness, row_transitions, column_transitions,
+                         wells // 2)
+
+
+def evaluate_features(features, weights=WEIGHTS):
+    return sum(weight * feature for weight, feature in zip(weights, features))
+
+
+def feature_evaluator(weights=WEIGHTS):
+    """
+        An evaluate(board, columns) function for placement.best_placement() that scores each board with the weights,
+        for trying out weights on features evaluate_surface() doesn't use.
+    """
+    def evaluate(board, columns):
+        return evaluate_features(board_features(board, columns), weights)
+    return evaluate
@@ -0,0 +1,91 @@
+"""
+    Evaluations per second of the board features in features.py and batch_features.py.  The boards are the candidates
+    a lookahead search over the queue scores: every drop placement of two tetrominos on boards from a seeded bot game.
+    Each board is scored by placement.evaluate_board(), by board_features() one at a time and by batch_features() in
+    batches of growing size, and the batch results are checked against the single board ones.
+
+        python features_benchmark.py --batch-sizes 1000 100000 1000000 --output features.json
+"""
+
+import argparse
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from batch_features import batch_features, masks_from_boards
+from engine import GameEngine
+from features import board_features
+from placement import best_placement, drop_placements, evaluate_board
+from results import write_json
+
+FeatureResult = namedtuple('FeatureResult', ['method', 'boards', 'seconds', 'evaluations_per_second'])
+
+
+def candidate_boards(count, seed=0, rows=13, columns=10):
+    """
+        At least count boards reached by dropping the next two tetrominos of a bot game on every board it passes
+        through, in the order a lookahead search would find them.
+    """
+    engine = GameEngine(rows, columns, seed=seed)
+    boards = []
+    while len(boards) < count:
+        if engine.lost:
+            seed += 1
+            engine = GameEngine(rows, columns, seed=seed)
+        board = tuple(engine.board.row_masks)
+        for first in drop_placements(board, engine.active_shape, columns):
+            boards.extend(second.board for second in drop_placements(first.board, engine.queue[0], columns))
+
+        # The game moves on by the bot's placement, or loses when there is none.
+        placement = best_placement(board, [engine.active_shape] + list(engine.queue), columns)
+        if placement is not None:
+            engine.orientation, engine.column = placement.orientation, placement.column
+        engine.hard_drop()
+    return boards[:count]
+
+
+def time_method(method, boards, run):
+    start = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - start
+    return FeatureResult(method, boards, seconds, boards / seconds)
+
+
+def run_feature_benchmark(batch_sizes, single_boards=20000, seed=0, columns=10):
+    boards = candidate_boards(max(batch_sizes + [single_boards]), seed)
+    results = [time_method('evaluate_board', single_boards,
+                           lambda: [evaluate_board(board, columns) for board in boards[:single_boards]]),
+               time_method('board_features', single_boards,
+                           lambda: [board_features(board, columns) for board in boards[:single_boards]])]
+
+    for size in batch_sizes:
+        masks = masks_from_boards(boards[:size])
+        results.append(time_method('batch_features', size, lambda: batch_features(masks, columns)))
+
+    # The batch gives the same features as the single board version.
+    expected = np.array([board_features(board, columns) for board in boards[:single_boards]])
+    if not (batch_features(masks_from_boards(boards[:single_boards]), columns) == expected).all():
+        raise AssertionError("batch_features() doesn't match board_features()")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure board feature evaluations per second.')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+    parser.add_argument('--single-boards', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='JSON file, JSON to stdout when not given')
+    arguments = parser.parse_args()
+
+    results = run_feature_benchmark(arguments.batch_sizes, arguments.single_boards, arguments.seed)
+    for result in results:
+        print(f"{result.method:<16} {result.boards:8} boards  {result.seconds * 1000:9.2f} ms  "
+              f"{result.evaluations_per_second:12,.0f} evaluations/s", file=sys.stderr)
+
+    write_json(results, arguments.output)
+
+
+if __name__ == '__main__':
+    main()
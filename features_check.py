@@ -0,0 +1,111 @@
+"""
+    Checks the board features of features.py and batch_features.py against a plain implementation that looks at every
+    cell of the board on its own.  Random boards of several sizes are compared with board_features(), and with
+    batch_features() both with NumPy's bitwise_count() and with the byte table used when NumPy is older than 2.0.
+
+        python features_check.py --boards 500 --seed 1
+"""
+
+import argparse
+import sys
+from random import Random
+
+import numpy as np
+
+import batch_features
+from features import FEATURES, board_features
+from placement import evaluate_board
+
+# Rows and columns of the boards checked, from the smallest board up to the widest one batch_features() takes.
+SIZES = ((1, 1), (5, 1), (4, 3), (13, 10), (20, 10), (30, 14), (30, 15), (20, 20), (40, 30), (63, 62))
+
+
+def grid_features(board, columns):
+    # The features of a board given as row bitmasks, counted straight from the grid of its cells.
+    rows = len(board)
+    grid = [[board[row] >> column & 1 for column in range(columns)] for row in range(rows)]
+    heights = []
+    for column in range(columns):
+        top = next((row for row in range(rows) if grid[row][column]), rows)
+        heights.append(rows - top)
+
+    holes = sum(1 for column in range(columns) for row in range(rows)
+                if not grid[row][column] and any(grid[above][column] for above in range(row)))
+    bumpiness = sum(abs(heights[column] - heights[column + 1]) for column in range(columns - 1))
+    row_transitions = 0
+    for row in range(rows):
+        cells = [1] + grid[row] + [1]
+        row_transitions += sum(cells[index] != cells[index + 1] for index in range(columns + 1))
+    column_transitions = 0
+    for column in range(columns):
+        cells = [0] + [grid[row][column] for row in range(rows)] + [1]
+        column_transitions += sum(cells[index] != cells[index + 1] for index in range(rows + 1))
+
+    # The walls are as tall as the board.
+    walled = [rows] + heights + [rows]
+    wells = 0
+    for column in range(columns):
+        depth = min(walled[column], walled[column + 2]) - heights[column]
+        if depth > 0:
+            wells += depth * (depth + 1) // 2
+    return (sum(heights), max(heights), holes, bumpiness, row_transitions, column_transitions, wells)
+
+
+def random_boards(count, rows, columns, random):
+    # Boards with an empty top of random height and the rest of the cells filled at a random density per board.
+    boards = []
+    for _ in range(count):
+        density = random.random()
+        top = random.randrange(rows + 1)
+        boards.append(tuple(0 if row < top else sum((random.random() < density) << column for column in range(columns))
+                            for row in range(rows)))
+    return boards
+
+
+def check_size(boards, columns, popcounts):
+    # The names of the checks that give different features from grid_features() for these boards.
+    failures = []
+    expected = [grid_features(board, columns) for board in boards]
+    if [tuple(board_features(board, columns)) for board in boards] != expected:
+        failures.append('board_features')
+
+    masks = batch_features.masks_from_boards(boards)
+    for name, popcount in popcounts:
+        batch_features.popcount = popcount
+        if [tuple(features) for features in batch_features.batch_features(masks, columns).tolist()] != expected:
+            failures.append(f'batch_features with {name}')
+        if not np.allclose(batch_features.score_boards(masks, columns), [evaluate_board(board, columns)
+                                                                         for board in boards]):
+            failures.append(f'score_boards with {name}')
+
+    cells = np.array([[[board[row] >> column & 1 for column in range(columns)] for row in range(len(board))]
+                      for board in boards], dtype=np.uint8)
+    if not (batch_features.masks_from_cells(cells * 3) == masks).all():
+        failures.append('masks_from_cells')
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the board features against a cell by cell implementation.')
+    parser.add_argument('--boards', type=int, default=300, help='random boards of each size')
+    parser.add_argument('--seed', type=int, default=0)
+    arguments = parser.parse_args()
+
+    popcounts = [('byte table', batch_features.byte_popcount)]
+    if hasattr(np, 'bitwise_count'):
+        popcounts.append(('bitwise_count', np.bitwise_count))
+
+    random = Random(arguments.seed)
+    failed = False
+    for rows, columns in SIZES:
+        failures = check_size(random_boards(arguments.boards, rows, columns, random), columns, popcounts)
+        print(f"{rows:3} x {columns:<3} {', '.join(failures) if failures else 'ok'}", file=sys.stderr)
+        failed = failed or bool(failures)
+    print(f"{len(FEATURES)} features of {arguments.boards * len(SIZES)} boards {'differ' if failed else 'match'}",
+          file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,291 +1,294 @@
+import contextlib
 from queue import Queue
-from random import choice
+from random import Random, getrandbits
 
-import os
 import pygame
 
-from tetromino import Tetromino
+from assets import assets, BACKGROUND_IMAGE, FONT_NAME
+from block_atlas import get_atlas
+from engine import GameEngine
+from shapes import SHAPES
+from input_handler import InputHandler
+from tetromino import pool
 from play_area import PlayArea
+from render_cache import SurfaceCache
+from dirty_renderer import DirtyRectRenderer
+from replay import ReplayWriter
+from spectator import SnapshotEncoder
+from allocations import allocations
+
+try:
+    from debug import Profiler
+except ImportError:
+    # debug.py is only a development tool, so without it the game runs with a profiler that records nothing.
+    class Profiler:
+        def __init__(self, enabled=False, window=120, history=36000):
+            self.enabled = False
+            self.visible = False
+            self.null_section = contextlib.nullcontext()
+
+        def section(self, name):
+            return self.null_section
+
+        def end_frame(self, frame_time, slack):
+            pass
+
+        def latency(self, name, latency):
+            pass
+
+        def toggle(self):
+            pass
+
+        def draw(self):
+            pass
+
+        def export(self, path):
+            pass
 
 
 class Game:
-    def __init__(self, window):
+    def __init__(self, window, dirty_rendering=False, seed=None, randomizer='random', replay_stream=None,
+                 profiler=None, rows=13, columns=10, das=170, arr=50, versus_client=None, spectator_publisher=None):
         self.window = window
-        self.play_area = PlayArea(self.window.get_width(), self.window.get_height())
-
-        # Create a two-dimensional array that represents the grid of the play area.  A cell will contain a zero
-        # to represent an empty cell or a Block object to represent an occupied cell.
-        self.play_grid = []
-        for row in range(self.play_area.rows):
-            self.play_grid.append([])
-            for column in range(self.play_area.columns):
-                self.play_grid[row].append(0)
-
-        # Tetromino setup
-        self.start_x = self.play_area.rect.x + self.play_area.rect.width // 2 - self.play_area.cell_size
-        self.start_y = int(self.window.get_height() * 0.2)
-        self.active_tetromino = pygame.sprite.GroupSingle(Tetromino(choice(['I', 'J', 'L', 'O', 'S', 'T', 'Z']),
-                                                                    self.start_x, self.start_y,
-                                                                    self.play_area.cell_size))
-
-        # Custom event creation for a timer to move the active tetromino down the playing area.
-        self.move_down_event = pygame.USEREVENT
+        self.play_area = PlayArea(self.window.get_width(), self.window.get_height(), rows, columns)
+
+        # A replay only records the seed, not the tetrominos, so a recorded game always needs one.
+        if replay_stream is not None and seed is None:
+            seed = getrandbits(63)
+
+        # The engine owns the rules and the board.  This class turns the engine's state into sprites on the window
+        # and turns key presses into engine actions.  The input handler times every move itself with the delayed auto
+        # shift and auto repeat rate, so the engine's own movement cooldown is turned off.
+        self.engine = GameEngine(self.play_area.rows, self.play_area.columns, seed=seed, movement_cooldown=0,
+                                 randomizer=randomizer)
+        self.board = self.engine.board
+
+        # Record every action and gravity step to the binary stream when one is given.
+        self.replay_writer = None
+        if replay_stream is not None:
+            self.replay_writer = ReplayWriter(replay_stream, self.engine)
+
+        # Screen position of the top left corner of the board's first cell, inside the play area's margin.  Everything
+        # on the board is placed from this corner and the cell size, so any board size and window size line up.
+        self.grid_x = self.play_area.rect.x + self.play_area.margin // 2
+        self.grid_y = self.play_area.rect.y
+
+        # Tetromino setup.  Tetrominos start at the spawn column with their bottom on the top of the board.
+        self.start_x = self.grid_x + self.engine.spawn_column * self.play_area.cell_size
+        self.start_y = self.grid_y
+
+        # Only the active and queued tetrominos are sprites.  Once a tetromino locks, the board's colors are all that
+        # is kept of it and the settled cells are drawn straight from them.
+        self.active_tetromino = pygame.sprite.GroupSingle(self.create_tetromino(self.engine.active_shape))
+
+        # Game time in milliseconds.  It only moves forward in update() in fixed steps, so gravity and the movement
+        # cooldown play out the same however fast the game is simulated and however often it is drawn.
+        self.time = 0
 
         # Set up a queue for the next three tetrominos to be played.
         self.tetromino_queue = Queue(maxsize=3)
-        for index in range(3):
-            self.tetromino_queue.put(Tetromino(choice(['I', 'J', 'L', 'O', 'S', 'T', 'Z']),
-                                               self.start_x, self.start_y, self.play_area.cell_size))
-        self.tetromino_on_board = pygame.sprite.Group()
-
-        # Player input delay setup
-        self.allowed_movement = True
-        self.time_of_movement = 0
-        self.movement_cooldown = 500
-
-        # When the player is holding down a key, multiple pygame.KEYDOWN events are generated. To limit the amount of
-        # unnecessary key events, set a delay on repeated key events so these events can't be generated during the
-        # cooldown time period.
-        pygame.key.set_repeat(self.movement_cooldown)
-
-        # Score setup
-        self.score = 0
-
-        # Lost flag
-        self.lost = False
-
-    def player_input_handler(self):
-        keys = pygame.key.get_pressed()
-
-        if self.allowed_movement:
-            # Left boundary check
-            if keys[pygame.K_LEFT] and self.active_tetromino.sprite.rect.left > \
-                    self.play_area.rect.left + self.play_area.margin:
-
-                self.active_tetromino.sprite.move(-self.active_tetromino.sprite.block_size, 0)
-                for tetromino in self.tetromino_on_board:
-                    if self.collision_check(self.active_tetromino, tetromino):
-                        self.active_tetromino.sprite.move(self.active_tetromino.sprite.block_size, 0)
-                self.allowed_movement = False
-                self.time_of_movement = pygame.time.get_ticks()
-
-            # Right boundary check
-            elif keys[pygame.K_RIGHT] and self.active_tetromino.sprite.rect.right < self.play_area.rect.right - \
-                    self.play_area.margin:
-
-                self.active_tetromino.sprite.move(self.active_tetromino.sprite.block_size, 0)
-
-                for tetromino in self.tetromino_on_board:
-                    if self.collision_check(self.active_tetromino, tetromino):
-                        self.active_tetromino.sprite.move(-self.active_tetromino.sprite.block_size, 0)
-
-                self.allowed_movement = False
-                self.time_of_movement = pygame.time.get_ticks()
-
-            elif keys[pygame.K_SPACE]:
-                self.active_tetromino.sprite.rotate()
-
-                # Rotate tetromino back if rotation causes the tetromino to leave the play area on the right or
-                # bottom side.  The tetromino can't rotate outside the left side of the play area since the rotation
-                # is always counterclockwise and the top left position stays the same before and after rotation.
-                if self.active_tetromino.sprite.rect.right > self.play_area.rect.right or \
-                        self.active_tetromino.sprite.rect.bottom > self.play_area.rect.bottom:
-                    self.active_tetromino.sprite.rotate(False)
-
-                # Rotate tetromino back if collision occurs.
-                for tetromino in self.tetromino_on_board:
-                    if self.collision_check(self.active_tetromino, tetromino):
-                        self.active_tetromino.sprite.rotate(False)
-
-                self.allowed_movement = False
-                self.time_of_movement = pygame.time.get_ticks()
-
-    def allow_movement_check(self):
-        # Using the get_ticks() method in the pygame.time.Clock() class, a timer can be created to control how quickly a
-        # tetromino can perform a movement command.  By tracking the time a movement command took place and comparing it
-        # to the current time, an elapsed period of time can be established.
-        if not self.allowed_movement:
-            current_time = pygame.time.get_ticks()
-            if current_time - self.time_of_movement >= self.movement_cooldown:
-                self.allowed_movement = True
-
-    def collision_check(self, active_tetromino, tetromino):
-        if self.tetromino_on_board:
-            # Check for rect collision before checking mask collision to increase performance.  Due to mask collision
-            # checking each pixel, this makes mask collision more performance heavy.  Only calling mask collision if a
-            # rect collision is found will limit the usage of the more resource intensive mask collision method to
-            # when it is only necessary.
-            if pygame.sprite.spritecollide(tetromino, active_tetromino, False):
-                return pygame.sprite.collide_mask(tetromino, active_tetromino.sprite) is not None
-
-    def move_down_active_tetromino(self):
-        self.active_tetromino.sprite.move(0, self.active_tetromino.sprite.block_size)
-
-        for tetromino in self.tetromino_on_board:
-            # Check for the lost condition of the active tetromino colliding with another tetromino on the play area,
-            # and it also crosses the boundary of the top of the play area.
-            if self.active_tetromino.sprite.rect.top < self.play_area.rect.y \
-                    and self.collision_check(self.active_tetromino, tetromino):
-                # Move the tetromino back to its position before it moved since a collision was detected.
-                self.active_tetromino.sprite.move(0, -self.active_tetromino.sprite.block_size)
-                self.lost = True
-                break
-
-            elif self.collision_check(self.active_tetromino, tetromino):
-                self.active_tetromino.sprite.move(0, -self.active_tetromino.sprite.block_size)
-                self.update_array_backed_play_grid()
-                self.tetromino_on_board.add(self.active_tetromino.sprite)
-
-                # Because the active tetromino is in a GroupSingle group, adding a sprite also removes the old sprite.
-                # The queue get() method removes the first element from the queue and then returns that object.
-                self.active_tetromino.add(self.tetromino_queue.get())
-                self.tetromino_queue.put(Tetromino(choice(['I', 'J', 'L', 'O', 'S', 'T', 'Z']),
-                                                   self.start_x, self.start_y, self.play_area.cell_size))
-
-        # Check if the active tetromino reached the bottom of play area.
-        if self.active_tetromino.sprite.rect.bottom > self.play_area.rect.bottom:
-            self.active_tetromino.sprite.move(0, -self.active_tetromino.sprite.block_size)
-            self.update_array_backed_play_grid()
-            self.tetromino_on_board.add(self.active_tetromino.sprite)
+        for shape in self.engine.queue:
+            self.tetromino_queue.put(self.create_tetromino(shape))
+
+        # Key presses and releases are queued with their game time and turned into moves by the input handler, which
+        # does its own auto repeat.  The repeated KEYDOWN events pygame can generate for a held key are turned off.
+        self.input_handler = InputHandler(das, arr, wall_distance=self.play_area.columns)
+        pygame.key.set_repeat()
+
+        # Surfaces for the background and the HUD that are reused between frames.
+        self.surface_cache = SurfaceCache()
+
+        # With dirty rendering only the changed regions of the window are redrawn each frame and dirty_rects holds
+        # the rects to pass to pygame.display.update().  Without it the whole window is redrawn and updated.
+        self.renderer = DirtyRectRenderer(self) if dirty_rendering else None
+        self.dirty_rects = None
+        self.cleared_rows_rect = None
+        self.locked_rect = None
+        self.score_rect = None
+        self.queue_rect = None
+
+        # Cross-check the active tetromino's blocks on screen against the engine's cells after every change the engine
+        # makes to it.  Only meant for debugging.
+        self.debug_collision = False
+
+        # In a versus game, line clears are sent to the opponent through the client and the garbage rows the opponent
+        # sends are added with add_garbage().  The hole in each garbage row is picked from the game's seed.
+        self.versus_client = versus_client
+        self.garbage_random = Random(self.engine.generator.seed)
+
+        # Spectators are sent a delta of the game's state every frame through the publisher when one is given.
+        self.spectator_publisher = spectator_publisher
+        self.spectator_encoder = SnapshotEncoder() if spectator_publisher is not None else None
+
+        # Section timings for the profiling overlay.  The default profiler is disabled and costs nothing to time with.
+        self.profiler = profiler if profiler is not None else Profiler(enabled=False)
+
+        # Place the first tetromino and its ghost from the engine.
+        self.ghost_offset = 0
+        self.ghost_rect = None
+        self.sync_active_tetromino()
+
+    @property
+    def score(self):
+        return self.engine.score
+
+    @property
+    def lost(self):
+        return self.engine.lost
+
+    def create_tetromino(self, shape):
+        # Tetrominos come from the shared pool and go back to it when they lock, so spawning one doesn't allocate.
+        return pool.acquire(shape, self.start_x, self.start_y, self.play_area.cell_size)
+
+    def release_tetrominos(self):
+        # Give the active and queued tetrominos back to the pool when the game is done with.
+        pool.release(self.active_tetromino.sprite)
+        while not self.tetromino_queue.empty():
+            pool.release(self.tetromino_queue.get())
+
+    def player_input_handler(self, event, now=None):
+        # Queue a key event at game time now, which defaults to the current game time.  Events for keys that aren't
+        # bound to an action are ignored.  Returns True when the event was used.
+        with self.profiler.section('player_input_handler'):
+            return self.input_handler.handle_event(event, self.time if now is None else now)
+
+    def apply_action(self, action, now):
+        # The engine ignores the action while its movement cooldown from the last action is still running.
+        pieces = self.engine.pieces
+        with self.profiler.section('handle_action'):
+            accepted = self.engine.handle_action(action, now)
+        if accepted:
+            self.follow_engine(pieces)
+
+    def sync_active_tetromino(self):
+        # Move the active tetromino sprite to the engine's position and orientation of the active tetromino.
+        tetromino = self.active_tetromino.sprite
+        if tetromino.orientation != self.engine.orientation:
+            tetromino.set_orientation(self.engine.orientation)
+        tetromino.set_rect_x(self.grid_x + self.engine.column * self.play_area.cell_size)
+        tetromino.set_rect_y(self.grid_y + self.engine.row * self.play_area.cell_size)
+
+        # The ghost shows where the tetromino would land.  It only moves when the tetromino or the board changes, so
+        # it's found here from the board's column tops rather than every frame.
+        self.ghost_offset = (self.engine.landing_row() - self.engine.row) * self.play_area.cell_size
+        self.ghost_rect = tetromino.rect.move(0, self.ghost_offset)
+
+        if self.debug_collision:
+            cells = sorted(self.grid_position(block.screen_x_pos, block.screen_y_pos)
+                           for block in tetromino.block_group)
+            assert cells == sorted(self.engine.active_cells()), \
+                f"Active tetromino is drawn at cells {cells} instead of {sorted(self.engine.active_cells())}"
+            assert not self.board.collides(cells), f"Active tetromino overlaps the board at cells {cells}"
+
+    def move_down_active_tetromino(self, now=None):
+        pieces = self.engine.pieces
+        self.engine.drop(self.time if now is None else now)
+        self.follow_engine(pieces)
+
+    def follow_engine(self, pieces):
+        # Bring the sprites up to date with the engine after a move, given the engine's piece count from before it.
+        # A change in the piece count means the active tetromino was locked onto the board.
+        if self.engine.pieces != pieces:
+            with self.profiler.section('full_row_handler'):
+                self.full_row_handler()
+
+            # Because the active tetromino is in a GroupSingle group, adding a sprite also removes the old sprite.
+            # The queue get() method removes the first element from the queue and then returns that object.  The
+            # locked tetromino goes back to the pool, where the new queued one may well be taken from.
+            locked = self.active_tetromino.sprite
+            # The renderer has to redraw where the tetromino locked, which can be away from where it was drawn last
+            # when it moved and locked in the same frame.  A tetromino always locks where its ghost was, since a hard
+            # drop moves it there and gravity only locks it once it has reached it.
+            self.locked_rect = (self.ghost_rect.copy() if self.locked_rect is None
+                                else self.locked_rect.union(self.ghost_rect))
             self.active_tetromino.add(self.tetromino_queue.get())
-            self.tetromino_queue.put(Tetromino(choice(['I', 'J', 'L', 'O', 'S', 'T', 'Z']),
-                                               self.start_x, self.start_y, self.play_area.cell_size))
+            pool.release(locked)
+            self.tetromino_queue.put(self.create_tetromino(self.engine.queue[-1]))
 
-    def update_array_backed_play_grid(self):
-        # Calculate what row and column each block would be in to update the cell's status in the play grid.
-        for block in self.active_tetromino.sprite.block_group:
-            row_pos = (block.screen_y_pos - self.play_area.rect.y + self.play_area.margin) // \
-                      self.play_area.cell_size
-            column_pos = (block.screen_x_pos - self.play_area.rect.x) // self.play_area.cell_size
-            self.play_grid[row_pos][column_pos] = block
+        if not self.engine.lost:
+            self.sync_active_tetromino()
+
+    def grid_position(self, x, y):
+        # Calculate what row and column of the play area a screen position falls in.
+        row = (y - self.grid_y) // self.play_area.cell_size
+        column = (x - self.grid_x) // self.play_area.cell_size
+        return row, column
 
     def full_row_handler(self):
-        number_of_full_rows = 0
-        last_full_row_grid_index = -1
-        last_full_row_y_pos = None
-
-        for row in range(self.play_area.rows):
-            occupied_cell_count = 0
-            for column in range(self.play_area.columns):
-                # If a cell doesn't hold a zero then there is a block occupying that cell.
-                if self.play_grid[row][column] != 0:
-                    occupied_cell_count += 1
-
-            # All columns with an occupied cell means a full row of blocks exists.
-            if occupied_cell_count == self.play_area.columns:
-                # Count the number of full rows found to determine how many rows to shift down the above tetrominos.
-                number_of_full_rows += 1
-
-                # Find the index of the last full row to know where the above tetrominos need to be shifted.
-                if row > last_full_row_grid_index:
-                    last_full_row_grid_index = row
-                    # Save the y position of the row to translate all blocks down one cell.
-                    last_full_row_y_pos = self.play_grid[row][0].screen_y_pos
-
-                self.clear_full_row(row)
-
-        if number_of_full_rows != 0:
-            self.shift_tetrominos_down(number_of_full_rows, last_full_row_grid_index, last_full_row_y_pos)
-
-    def clear_full_row(self, row):
-        # Set a pointer to the first tetromino for determining when to condense/separate.
-        last_referenced_tetromino = self.play_grid[row][0].tetromino
-
-        # Loop through each cell in the row to destroy the block and condense/separate a tetromino as needed.
-        for index in range(self.play_area.columns):
-            # Draw over the block's image at its location on the screen.
-            pygame.draw.rect(self.play_grid[row][index].tetromino.image, 'black',
-                             self.play_grid[row][index].rect)
-
-            # Kill method removes the block from the pygame.sprite.Group it is in.
-            self.play_grid[row][index].kill()
-            self.score += 10
-
-            # Call the condense_or_separate method only when the last block of the tetromino is destroyed in the row.
-            # Using the pointer, the last block will be detected when the pointer and the current tetromino differ.
-            if self.play_grid[row][index].tetromino != last_referenced_tetromino:
-                # Check that the last tetromino wasn't completely destroyed and is still on the play area.
-                if last_referenced_tetromino.block_group:
-                    new_tetromino = last_referenced_tetromino.condense_or_separate()
-                    if new_tetromino is not None:
-                        self.tetromino_on_board.add(new_tetromino)
-
-                    # Move the pointer to the reference of the current tetromino.
-                    last_referenced_tetromino = self.play_grid[row][index].tetromino
-                else:
-                    # Since the tetromino was completely destroyed, remove it from its pygame.sprite.Group.
-                    last_referenced_tetromino.kill()
-                    last_referenced_tetromino = self.play_grid[row][index].tetromino
-
-            # Last block in the row gets condensed/separated.
-            if index == self.play_area.columns - 1:
-                if self.play_grid[row][index].tetromino.block_group:
-                    new_tetromino = self.play_grid[row][index].tetromino.condense_or_separate()
-                    if new_tetromino is not None:
-                        self.tetromino_on_board.add(new_tetromino)
-
-                else:
-                    self.play_grid[row][index].tetromino.kill()
-
-            # Change the cell to zero to represent it's in an empty state.
-            self.play_grid[row][index] = 0
-
-    def shift_tetrominos_down(self, number_of_rows, last_row_grid_index, last_row_y_pos):
-        # Shift all tetrominos above the full row down.
-        for tetromino in self.tetromino_on_board:
-            if tetromino.rect.y < last_row_y_pos:
-                tetromino.move(0, tetromino.block_size * number_of_rows)
-
-        for column in range(self.play_area.columns):
-            # Start at the row above the last full row and increment the references in the occupied cells by one.
-            # To move down in the array-backed grid, increment its index.
-            for row in range(last_row_grid_index - 1, -1, -1):
-                if self.play_grid[row][column] != 0:
-                    self.play_grid[row + number_of_rows][column] = self.play_grid[row][column]
-                    self.play_grid[row][column] = 0
+        # The engine clears full rows from the board and moves the rows above them down when a tetromino locks.  The
+        # settled cells are drawn from the board so only the region that changed on screen is kept here.
+        if self.engine.last_clear:
+            full_rows = [row for row, _ in self.engine.last_clear]
+
+            # Everything from the top of the play area down to the lowest cleared row has moved.
+            self.cleared_rows_rect = pygame.Rect(self.play_area.rect.x, self.play_area.rect.y,
+                                                 self.play_area.rect.width,
+                                                 (max(full_rows) + 1) * self.play_area.cell_size +
+                                                 self.play_area.margin).clip(self.play_area.rect)
+
+            if self.versus_client is not None:
+                self.versus_client.send_line_clear(len(full_rows))
+
+    def add_garbage(self, lines, hole=None, now=None):
+        # Push garbage rows from the opponent onto the bottom of the board at game time now, which defaults to the
+        # current game time.  Every settled cell moves so the whole play area is redrawn.
+        if hole is None:
+            hole = self.garbage_random.randrange(self.board.columns)
+        self.engine.add_garbage(lines, hole, self.time if now is None else now)
+        self.cleared_rows_rect = self.play_area.rect.copy()
+        if not self.engine.lost:
+            self.sync_active_tetromino()
 
     def draw_game_window(self):
-        # Separate parts of the GUI into inner functions for better organization.
+        # Separate parts of the GUI into inner functions for better organization.  Each surface is built through the
+        # surface cache so it is only built again when the window size, score or queued tetromino it shows changes.
+        window_size = self.window.get_size()
+
         def game_bg():
             # Credit: Image by Freepik
-            bg_image = pygame.image.load(os.path.join('assets', 'abstract_pixel_rain_background.jpg')).convert_alpha()
-            scaled_bg_image = pygame.transform.scale(bg_image, (self.window.get_width(), self.window.get_height()))
-            bg = pygame.Surface((self.window.get_width(), self.window.get_height()))
-            bg.blit(scaled_bg_image, (0, 0))
-            return bg
+            # The image is loaded and scaled once by the asset manager and shared by every game.
+            return assets.image(BACKGROUND_IMAGE, window_size)
 
         def score_surface():
-            score_font = pygame.font.SysFont('comicsans', int(self.window.get_height() * 0.06))
+            score_font = assets.font(FONT_NAME, int(self.window.get_height() * 0.06))
             score_label = score_font.render(f"Score: {self.score}", True, (0, 255, 0))
             score_surf = pygame.Surface((score_label.get_width() + 10, score_label.get_height()))  # 10 pixel padding
             pygame.draw.rect(score_surf, (0, 255, 255), score_surf.get_rect(), 1)
             score_surf.blit(score_label, (5, -5))
+            # The label and the box.
+            allocations['surfaces'] += 2
             return score_surf
 
         def controls_surface():
-            controls_label_font = pygame.font.SysFont('comicsans', int(self.window.get_height() * 0.03))
+            controls_label_font = assets.font(FONT_NAME, int(self.window.get_height() * 0.03))
             left_arrow_label = controls_label_font.render('Left arrow = move left', True, (255, 255, 255))
             right_arrow_label = controls_label_font.render('Right arrow = move right', True, (255, 255, 255))
             spacebar_label = controls_label_font.render('Spacebar = rotate', True, (255, 255, 255))
+            down_arrow_label = controls_label_font.render('Down arrow = hard drop', True, (255, 255, 255))
 
-            controls_label_list = (left_arrow_label, right_arrow_label, spacebar_label)
+            controls_label_list = (left_arrow_label, right_arrow_label, spacebar_label, down_arrow_label)
             greatest_label_width = 0
             for label in controls_label_list:
                 if label.get_width() > greatest_label_width:
                     greatest_label_width = label.get_width()
 
             controls_surf = pygame.Surface((greatest_label_width + 10,  # 10 pixel padding
-                                            (spacebar_label.get_height() * 3) + (self.window.get_height() * 0.03) + 10))
+                                            (spacebar_label.get_height() * 3) + (self.window.get_height() * 0.08) + 10))
             pygame.draw.rect(controls_surf, (0, 255, 255), controls_surf.get_rect(), 1)
+            # The labels and the box.
+            allocations['surfaces'] += len(controls_label_list) + 1
 
             controls_surf.blit(left_arrow_label, (5, 5))
             controls_surf.blit(right_arrow_label, (5, (self.window.get_height() * 0.01) + right_arrow_label.get_height() + 5))
             controls_surf.blit(spacebar_label, (5, (self.window.get_height() * 0.06) + spacebar_label.get_height() + 5))
+            controls_surf.blit(down_arrow_label,
+                               (5, (self.window.get_height() * 0.11) + down_arrow_label.get_height() + 5))
             return controls_surf
 
         def tetromino_queue_surface(queued_tetromino):
             # Use 10 pixel for padding.
             queue_surf = pygame.Surface((self.play_area.cell_size * 3 + 10, self.play_area.cell_size * 4 + 10))
+            allocations['surfaces'] += 1
             pygame.draw.rect(queue_surf, (255, 0, 255), queue_surf.get_rect(), 1)
 
             queue_surf.blit(queued_tetromino.image,
@@ -293,15 +296,29 @@ class Game:
                              (queue_surf.get_height() // 2) - (queued_tetromino.rect.height // 2)))
             return queue_surf
 
-        self.window.blit(game_bg(), (0, 0))
+        bg_surf = self.surface_cache.get('background', window_size, game_bg)
+        controls_surf = self.surface_cache.get('controls', window_size, controls_surface)
+        score_surf = self.surface_cache.get('score', (window_size, self.score), score_surface)
+
+        self.window.blit(bg_surf, (0, 0))
         self.window.blit(self.play_area.image, (self.play_area.rect.x, self.play_area.rect.y))
 
-        self.window.blit(controls_surface(), (10, self.window.get_height() - controls_surface().get_height() - 10))
-        self.window.blit(score_surface(), ((self.window.get_width() - score_surface().get_width() - 10), 10))
+        self.window.blit(controls_surf, (10, self.window.get_height() - controls_surf.get_height() - 10))
+        self.window.blit(score_surf, ((self.window.get_width() - score_surf.get_width() - 10), 10))
 
+        # Keep the area covered by the score box and the queue panel for the dirty rect renderer.  The window's clip
+        # area limits the rect returned by blit() so the full rect of each surface is built instead.
+        self.score_rect = score_surf.get_rect(topleft=(self.window.get_width() - score_surf.get_width() - 10, 10))
+        queue_rects = []
         for index, tetromino in enumerate(self.tetromino_queue.queue):
             height_offset = self.play_area.rect.top + ((self.play_area.cell_size * 4 + (self.window.get_height() * 0.0235)) * index)
-            self.window.blit(tetromino_queue_surface(tetromino), (self.play_area.rect.right + 10, height_offset))
+            # The panels are cached by shape rather than by place in the queue, since every lock moves each shape up
+            # a place and would otherwise build all three again.
+            queue_surf = self.surface_cache.get(f'queue_{tetromino.shape}', window_size,
+                                                lambda: tetromino_queue_surface(tetromino))
+            self.window.blit(queue_surf, (self.play_area.rect.right + 10, height_offset))
+            queue_rects.append(queue_surf.get_rect(topleft=(self.play_area.rect.right + 10, height_offset)))
+        self.queue_rect = queue_rects[0].unionall(queue_rects[1:])
 
         # Draws a visual representation of the array-backed grid.
         # for row in range(1, self.play_area_rows):
@@ -311,15 +328,72 @@ class Game:
         #         pygame.draw.line(self.play_area, 'red', (self.cell_size * column + 2, 0),
         #                          ((self.cell_size * column), self.play_area_rect.height))
 
-    def run(self):
-        self.allow_movement_check()
-        self.player_input_handler()
-        self.full_row_handler()
-
+    def draw_blocks(self):
+        # The active tetromino, its ghost and every settled cell on the board are drawn from the block atlas with one
+        # blits() call.  Empty rows are skipped using the board's row bitmasks.
+        board = self.board
+        cell_size = self.play_area.cell_size
+        atlas = get_atlas(cell_size)
+        tiles = atlas.color_tiles
+        tetromino = self.active_tetromino.sprite
+        # The ghost is drawn first so the tetromino covers it once it has landed.
+        ghost_tile = atlas.ghost_tiles[SHAPES.index(tetromino.shape) + 1]
+        blits = [(ghost_tile, (block.screen_x_pos, block.screen_y_pos + self.ghost_offset))
+                 for block in tetromino.block_group]
+        blits += [(block.image, (block.screen_x_pos, block.screen_y_pos)) for block in tetromino.block_group]
+        for row, row_mask in enumerate(board.row_masks):
+            if row_mask:
+                y = self.grid_y + row * cell_size
+                start = row * board.columns
+                for column, color in enumerate(board.colors[start:start + board.columns]):
+                    if color:
+                        blits.append((tiles[color], (self.grid_x + column * cell_size, y)))
+        self.window.blits(blits, doreturn=False)
+
+    def draw(self):
         # The order of the drawing on screen matters and the background is always first. The drawing of the background
         # every frame is a way to clear the screen of the previous frame.  This allows the imitation of movement on the
         # screen by drawing an object in a slightly new position compared to its previous position.  An example in this
         # game is the falling of a tetromino from the top to the bottom of the play area.
-        self.draw_game_window()
-        self.active_tetromino.draw(self.window)
-        self.tetromino_on_board.draw(self.window)
+        if self.renderer is not None:
+            with self.profiler.section('dirty_render'):
+                self.dirty_rects = self.renderer.draw()
+        else:
+            with self.profiler.section('draw_game_window'):
+                self.draw_game_window()
+            with self.profiler.section('draw_blocks'):
+                self.draw_blocks()
+
+    def broadcast(self):
+        # Send the spectators this frame's changes.  A message the publisher had to drop breaks the chain of deltas, so
+        # the next message is a keyframe.
+        if self.spectator_publisher is None:
+            return
+        with self.profiler.section('broadcast'):
+            message = self.spectator_encoder.encode(self.engine)
+        if not self.spectator_publisher.publish(message):
+            self.spectator_encoder.keyframe = True
+
+    def update(self, timestep):
+        """
+            Advance the game by timestep milliseconds of game time.  Every queued key press and auto repeat in that time
+            is applied at its own time, in order with the gravity steps, so the result doesn't depend on how the time
+            is split into steps.
+        """
+        end = self.time + timestep
+        for now, action in self.input_handler.actions(end):
+            self.apply_gravity(now)
+            # Input handling is timed from the key event being queued to its move being made, the same as when the
+            # keys were read and the moves made in one step.
+            with self.profiler.section('player_input_handler'):
+                self.apply_action(action, now)
+        self.time = end
+        self.apply_gravity(end)
+
+    def apply_gravity(self, now):
+        # Take a gravity step for every gravity interval that has passed by game time now, the same way
+        # GameEngine.update() does.
+        engine = self.engine
+        while not engine.lost and now - engine.time_of_gravity >= engine.gravity_interval:
+            engine.time_of_gravity += engine.gravity_interval
+            self.move_down_active_tetromino(engine.time_of_gravity)
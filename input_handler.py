@@ -0,0 +1,103 @@
+"""
+    Event driven player input.  Key presses and releases are queued with the game time they happened at instead of the
+    keyboard being polled once a frame, so a tap that starts and ends between two frames still moves the tetromino.
+    Holding left or right moves once, waits the delayed auto shift (DAS) and then repeats every auto repeat rate (ARR)
+    milliseconds.  Every action is applied at its own time, between the gravity steps around it, rather than at the end
+    of the frame it was read in.
+"""
+
+import time
+from collections import deque
+
+import pygame
+
+KEY_BINDINGS = {pygame.K_LEFT: 'left', pygame.K_RIGHT: 'right', pygame.K_SPACE: 'rotate',
+                pygame.K_DOWN: 'hard_drop'}
+# Actions that auto repeat while their key is held.  Rotating and hard dropping only happen once per press.
+SHIFT_ACTIONS = ('left', 'right')
+
+
+class InputHandler:
+    """
+        Turns timestamped key events into timed actions.  handle_event() queues an event at a game time and actions()
+        hands out the presses and auto repeats up to a game time in the order they happen.  das and arr are in
+        milliseconds and an arr of zero shifts straight to the wall, which is wall_distance moves away at most.  Up to
+        buffer_size presses of each action can wait in the queue, so mashing one key can't crowd out the others.
+    """
+    def __init__(self, das=170, arr=50, wall_distance=10, buffer_size=4, key_bindings=None):
+        self.das = das
+        self.arr = arr
+        self.wall_distance = wall_distance
+        self.buffer_size = buffer_size
+        self.key_bindings = KEY_BINDINGS if key_bindings is None else key_bindings
+
+        # Queued key events as (game time, action, pressed, time received) in the order they were read.
+        self.events = deque()
+        self.buffered = {action: 0 for action in self.key_bindings.values()}
+
+        # The shift keys held down, the most recent last.  Only the most recent one repeats and releasing it hands
+        # the repeat back to the other one if it's still held.
+        self.held = []
+        self.next_repeat = None
+
+        # perf_counter() times the presses handed out by actions() were received at, for measuring input latency.
+        self.applied = []
+
+    def handle_event(self, event, now):
+        # Queue a KEYDOWN or KEYUP event for a bound key at game time now.  Returns True when the event was used.
+        action = self.key_bindings.get(getattr(event, 'key', None))
+        if action is None or event.type not in (pygame.KEYDOWN, pygame.KEYUP):
+            return False
+        pressed = event.type == pygame.KEYDOWN
+        if pressed:
+            if self.buffered[action] >= self.buffer_size:
+                return True
+            self.buffered[action] += 1
+        self.events.append((now, action, pressed, time.perf_counter()))
+        return True
+
+    def actions(self, end):
+        """
+            Yield (time, action) for every press and auto repeat up to game time end, in the order they happen.  Auto
+            repeats are timed from the press itself, so they keep their rate however the game is stepped or drawn.
+        """
+        events = self.events
+        while True:
+            event_time = events[0][0] if events else None
+            repeat_time = self.next_repeat if self.held else None
+            if repeat_time is not None and repeat_time <= end and (event_time is None or repeat_time < event_time):
+                action = self.held[-1]
+                if self.arr > 0:
+                    self.next_repeat = repeat_time + self.arr
+                    yield repeat_time, action
+                else:
+                    # Shift to the wall at once and stop repeating until a shift key is pressed or released.
+                    self.next_repeat = None
+                    for _ in range(self.wall_distance):
+                        yield repeat_time, action
+                continue
+
+            if event_time is None or event_time > end:
+                return
+
+            now, action, pressed, received = events.popleft()
+            if pressed:
+                self.buffered[action] -= 1
+                if action in SHIFT_ACTIONS:
+                    if action in self.held:
+                        self.held.remove(action)
+                    self.held.append(action)
+                    self.next_repeat = now + self.das
+                self.applied.append(received)
+                yield now, action
+            elif action in self.held:
+                repeating = self.held[-1] == action
+                self.held.remove(action)
+                # The shift key still held waits out the delayed auto shift again before it repeats.
+                if repeating and self.held:
+                    self.next_repeat = now + self.das
+
+    def take_applied(self):
+        applied = self.applied
+        self.applied = []
+        return applied
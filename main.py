@@ -4,107 +4,314 @@
     A heavier use of comments were used to explain the thinking and logic used for project portfolio purpose.
 """
 
+import time
+
+# Taken before the other imports so the startup report includes the time spent importing pygame and the game.
+STARTED = time.perf_counter()
+
+import os
 import pygame
 import sys
 
-from game import Game
+from assets import assets, BACKGROUND_IMAGE, FONT_NAME
+from game import Game, Profiler
+from spectator import SpectatorPublisher
+from versus import VersusClient, START, GARBAGE, WIN, LOST, JOIN, DISCONNECTED
 
 
 class GameState:
     def __init__(self):
         self.state = 'main_menu'
-        self.game = Game(window)
-        self.lost_count = 0
+        self.replay_file = None
+        # A versus game is played against an opponent through the versus server.  The connection is kept open
+        # between matches.
+        self.versus_client = VersusClient(*VERSUS_SERVER) if VERSUS_SERVER else None
+        self.won = False
+        # Every game is streamed to the spectator server when one is set.
+        self.spectator_publisher = SpectatorPublisher(*SPECTATOR_SERVER) if SPECTATOR_SERVER else None
+        self.game = None
+        self.game = self.new_game()
+        # Real time, scaled by SIMULATION_SPEED, that hasn't been simulated yet.  It's used up in TIMESTEP steps.
+        self.accumulator = 0
+        # Milliseconds spent on the game over screen.
+        self.lost_time = 0
 
-    def main_menu(self):
+    def new_game(self, seed=None):
+        # The tetrominos of the last game go back to the pool for the new one.
+        if self.game is not None:
+            self.game.release_tetrominos()
+        # Each game can be recorded to its own replay file named after the time it was created.
+        if self.replay_file is not None:
+            self.replay_file.close()
+            self.replay_file = None
+        if RECORD_REPLAYS:
+            os.makedirs(REPLAY_DIRECTORY, exist_ok=True)
+            path = os.path.join(REPLAY_DIRECTORY, time.strftime('%Y%m%d-%H%M%S') + '.ttr')
+            self.replay_file = open(path, 'wb')
+        return Game(window, DIRTY_RENDERING, seed=seed, replay_stream=self.replay_file, profiler=profiler,
+                    rows=BOARD_ROWS, columns=BOARD_COLUMNS, das=DAS, arr=ARR, versus_client=self.versus_client,
+                    spectator_publisher=self.spectator_publisher)
+
+    def main_menu(self, frame_time):
         # pygame.event.wait() will allow the operating system to put the program to sleep when no events are needed
         # to be handled.  This allows the program to free up CPU resources while it is asleep.
         event = pygame.event.wait()
         if event.type == pygame.QUIT:
-            pygame.quit()
-            sys.exit()
+            quit_game()
         if event.type == pygame.MOUSEBUTTONDOWN:
+            if self.versus_client is not None:
+                # The game starts once the server has found an opponent and sent the seed for both games.
+                self.versus_client.send(JOIN)
+                self.versus_client.flush()
+                self.state = 'waiting'
+                return
             self.state = 'main_game'
-
-            # Start the USEREVENT before the game starts. This is so it doesn't send unnecessary events for the event
-            # handler to process and cause the program to not be put to sleep.
-            pygame.time.set_timer(self.game.move_down_event, 1000)
+            # Game time starts when the game does, not when it was created behind the menu.
+            self.accumulator = 0
 
         window.fill(BG_COLOR)
 
-        title_font = pygame.font.SysFont("comicsans", int(HEIGHT * 0.06))
-        title_label = title_font.render("Tetris Project", True, (255, 255, 255))
-        start_font = pygame.font.SysFont("comicsans", int(HEIGHT * 0.06))
-        start_label = start_font.render("Press a mouse button to begin...", True, (255, 255, 255))
+        # The labels are rendered once and reused from the asset manager on every later frame.
+        title_label = assets.text("Tetris Project", FONT_NAME, int(HEIGHT * 0.06), (255, 255, 255))
+        start_label = assets.text("Press a mouse button to begin...", FONT_NAME, int(HEIGHT * 0.06), (255, 255, 255))
 
         window.blit(title_label, (WIDTH / 2 - title_label.get_width() / 2,
                                   (HEIGHT / 2) / 2 - title_label.get_height() / 2))
         window.blit(start_label, (WIDTH / 2 - start_label.get_width() / 2,
                                   HEIGHT / 2 - start_label.get_height() / 2))
         pygame.display.update()
+        startup_mark('first menu frame')
 
-    def main_game(self):
-        if self.game.lost:
-            self.state = 'lost'
-
+    def waiting(self, frame_time):
+        # Wait for the versus server to start a match without blocking, so the window keeps responding.
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
+                quit_game()
 
-            elif event.type == self.game.move_down_event:
-                self.game.move_down_active_tetromino()
+        for kind, value in self.versus_client.receive():
+            if kind == START:
+                self.game = self.new_game(seed=value)
+                self.won = False
+                self.state = 'main_game'
+                self.accumulator = 0
+                return
+            if kind == DISCONNECTED:
+                # Without a server the game goes back to being played alone.
+                self.versus_client = None
+                self.game = self.new_game()
+                self.state = 'main_menu'
+                return
 
-        self.game.run()
+        window.fill(BG_COLOR)
+        waiting_label = assets.text("Waiting for an opponent...", FONT_NAME, int(HEIGHT * 0.06), (255, 255, 255))
+        window.blit(waiting_label, (WIDTH / 2 - waiting_label.get_width() / 2,
+                                    HEIGHT / 2 - waiting_label.get_height() / 2))
         pygame.display.update()
 
-    def game_over(self):
+    def receive_versus_messages(self):
+        # Garbage from the opponent is added before this frame's steps.  The opponent losing or leaving wins the match.
+        # If the connection to the server is lost the game carries on alone.
+        for kind, value in self.versus_client.receive():
+            if kind == GARBAGE:
+                self.game.add_garbage(value)
+            elif kind == WIN:
+                self.won = True
+            elif kind == DISCONNECTED:
+                self.versus_client = None
+                self.game.versus_client = None
+                return
+        for round_trip in self.versus_client.take_round_trips():
+            profiler.latency('round_trip', round_trip)
+
+    def main_game(self, frame_time):
+        # The game logic runs in fixed steps of game time, separately from drawing.  The time the last frame took is
+        # added to the accumulator and as many whole steps as fit in it are simulated, leaving the remainder for the
+        # next frame.  Each step does the same thing whether the window is drawn at 30 or 144 frames per second, or
+        # the simulation is sped up, so a game plays out the same way at any frame rate.  A long frame, such as the
+        # window being dragged, is cut short so the game doesn't try to catch up on all of it at once.
+        self.accumulator += min(frame_time, MAX_FRAME_TIME) * SIMULATION_SPEED
+
+        # Key events are queued at the game time the last step of this frame ends at, so their moves are in this
+        # frame rather than the next one.
+        input_time = self.game.time + int(self.accumulator // TIMESTEP) * TIMESTEP
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                quit_game()
+
+            elif event.type == pygame.KEYDOWN and event.key == PROFILER_KEY:
+                profiler.toggle()
+                # Hiding the overlay leaves it on screen until the whole window is drawn again.
+                if self.game.renderer is not None:
+                    self.game.renderer.full_redraw = True
+
+            else:
+                self.game.player_input_handler(event, input_time)
+
+        if self.versus_client is not None:
+            self.receive_versus_messages()
+
+        while self.accumulator >= TIMESTEP and not self.game.lost and not self.won:
+            self.game.update(TIMESTEP)
+            self.accumulator -= TIMESTEP
+
+        if self.game.lost or self.won:
+            self.state = 'lost'
+            self.lost_time = 0
+            if self.replay_file is not None:
+                self.replay_file.flush()
+            if self.versus_client is not None and self.game.lost:
+                self.versus_client.send(LOST)
+
+        self.game.broadcast()
+
+        # Everything the game sent this frame, such as garbage for its line clears, goes out in one batch.
+        if self.versus_client is not None:
+            self.versus_client.flush()
+
+        self.game.draw()
+        if profiler.visible:
+            profiler.draw()
+            # The overlay is drawn over the regions the dirty renderer tracks so the whole window is redrawn and
+            # updated while it is shown.
+            if self.game.renderer is not None:
+                self.game.renderer.full_redraw = True
+            pygame.display.update()
+        else:
+            # With dirty rendering, only the regions of the window that changed are updated.  Otherwise dirty_rects
+            # is None and the whole window is updated.
+            pygame.display.update(self.game.dirty_rects)
+
+        # The moves of the key presses applied this frame are on the window now.
+        presented = time.perf_counter()
+        for received in self.game.input_handler.take_applied():
+            profiler.latency('input_latency', (presented - received) * 1000)
+        if startup_mark('first game frame'):
+            startup_report()
+
+    def game_over(self, frame_time):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
+                quit_game()
 
         window.fill(BG_COLOR)
-        lost_font = pygame.font.SysFont("comicsans", int(HEIGHT * 0.06))
-        lost_label = lost_font.render("Game Over!!", True, (255, 255, 255))
+        lost_label = assets.text("You Win!!" if self.won else "Game Over!!", FONT_NAME, int(HEIGHT * 0.06),
+                                 (255, 255, 255))
         window.blit(lost_label, (WIDTH / 2 - lost_label.get_width() / 2, HEIGHT / 2 - lost_label.get_height() / 2))
         pygame.display.update()
 
-        # Wait three seconds in the lost state before going back to the main menu.
-        if self.lost_count > FPS * 3:
+        # Wait three seconds in the lost state before going back to the main menu.  The wait is timed rather than
+        # counted in frames so it's the same at any frame rate.
+        self.lost_time += frame_time
+        if self.lost_time >= GAME_OVER_DELAY:
             # Reset the game by creating a new Game object.
-            self.game = Game(window)
+            self.game = self.new_game()
+            self.won = False
             self.state = 'main_menu'
-        else:
-            self.lost_count += 1
 
-    def state_manager(self):
+    def state_manager(self, frame_time):
         match self.state:
             case 'main_menu':
-                self.main_menu()
+                self.main_menu(frame_time)
+            case 'waiting':
+                self.waiting(frame_time)
             case 'main_game':
-                self.main_game()
+                self.main_game(frame_time)
             case 'lost':
-                self.game_over()
+                self.game_over(frame_time)
+
+
+def startup_mark(name):
+    # Record how long after STARTED a point of the startup was first reached.  Returns True the first time only.
+    if name in startup_times:
+        return False
+    startup_times[name] = (time.perf_counter() - STARTED) * 1000
+    return True
+
+
+def startup_report():
+    # Print the time to each point of the startup, and the time between them, when STARTUP_REPORT is set.
+    if not STARTUP_REPORT:
+        return
+    previous = 0
+    for name, elapsed in startup_times.items():
+        print(f"{name:<18} {elapsed:8.1f} ms  (+{elapsed - previous:.1f} ms)", file=sys.stderr)
+        previous = elapsed
+
+
+# Milliseconds from STARTED to each point of the startup, in the order they were reached.
+startup_times = {}
+
+
+def quit_game():
+    # Write the profiling data before closing when an export file is set.
+    if PROFILE_EXPORT:
+        profiler.export(PROFILE_EXPORT)
+    pygame.quit()
+    sys.exit()
 
 
 # Only run the program from this python file directly and not when imported as a module.
 if __name__ == "__main__":
+    startup_mark('imports')
     # General setup
     pygame.init()
+    startup_mark('pygame.init')
     clock = pygame.time.Clock()
 
     # Screen setup
     BG_COLOR = (0, 0, 0)
     WIDTH, HEIGHT = 800, 600
     # WIDTH, HEIGHT = 1920, 1080
+    # The size of the board in cells.  The play area and everything on it are scaled to fit any board in the window.
+    BOARD_ROWS, BOARD_COLUMNS = 13, 10
+    # BOARD_ROWS, BOARD_COLUMNS = 20, 10
+    # The frame rate the window is drawn at.  Zero draws as fast as possible.
     FPS = 60
+    # FPS = 144
+    # The game logic is updated in fixed steps of TIMESTEP milliseconds of game time, however often the window is
+    # drawn.  SIMULATION_SPEED scales how much game time passes each real millisecond, so 2 plays the game at double
+    # speed.  MAX_FRAME_TIME is the most real time simulated after a single frame.
+    TIMESTEP = 10
+    SIMULATION_SPEED = 1
+    MAX_FRAME_TIME = 250
+    GAME_OVER_DELAY = 3000
+    # Holding left or right moves the tetromino once, waits DAS milliseconds and then moves it every ARR milliseconds.
+    # An ARR of zero moves it straight to the wall.
+    DAS, ARR = 170, 50
+    # Redraw and update only the changed regions of the window each frame.  Useful on low-power machines where pushing
+    # the whole window every frame limits the frame rate.
+    DIRTY_RENDERING = False
+    # Record every game to a compact binary replay that replay.py can play back.
+    RECORD_REPLAYS = False
+    REPLAY_DIRECTORY = 'replays'
+    # Address of a versus server started with 'python versus.py' as (host, port), or None to play alone.
+    VERSUS_SERVER = None
+    # VERSUS_SERVER = ('127.0.0.1', 7777)
+    # Address of a spectator server started with 'python spectator.py' as (host, port), or None to not stream games.
+    SPECTATOR_SERVER = None
+    # SPECTATOR_SERVER = ('127.0.0.1', 7778)
+    # Time the sections of each frame for the profiling overlay, which PROFILER_KEY shows and hides.  The timings are
+    # written to PROFILE_EXPORT on exit when it is set to a .csv or .json path.
+    PROFILING = False
+    PROFILER_KEY = pygame.K_F3
+    PROFILE_EXPORT = None
+    # Print how long the game took to start, up to its first menu and first game frame, to stderr.
+    STARTUP_REPORT = False
+    profiler = Profiler(enabled=PROFILING)
     window = pygame.display.set_mode((WIDTH, HEIGHT))
     pygame.display.set_caption("Tetris Project")
+    startup_mark('display')
+    # Find the font and load the background in the background while the menu is shown, so neither is waited on when
+    # the first game is drawn.
+    assets.prewarm(fonts=[FONT_NAME], images=[(BACKGROUND_IMAGE, (WIDTH, HEIGHT))])
     game_state = GameState()
+    startup_mark('game state')
 
     # Game loop
     while True:
-        game_state.state_manager()
+        # The time the previous frame took, from the last call to clock.tick().
+        game_state.state_manager(clock.get_time())
         # Limit the frames per second
         clock.tick(FPS)
+        # The frame time and the part of it clock.tick() spent waiting for the next frame.
+        profiler.end_frame(clock.get_time(), clock.get_time() - clock.get_rawtime())
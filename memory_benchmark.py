@@ -0,0 +1,97 @@
+"""
+    Memory footprint of a long game.  Plays a seeded game through the pygame front end with the placement bot, drawing
+    a frame after every lock, and samples the memory allocated by Python, the peak since the last sample, the number
+    of live sprites, the tetrominos, blocks and surfaces made since the last sample and the garbage collector's runs
+    as the pieces pile up.  A bounded footprint shows as samples that level off instead of growing with the piece count,
+    and tetrominos recycled from the pool show as few or no allocations after the first sample.  Uses the SDL dummy
+    video driver unless another one is set.
+
+        python memory_benchmark.py --pieces 10000 --output memory.json
+"""
+
+import os
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import argparse
+import gc
+import sys
+import tracemalloc
+from collections import namedtuple
+
+import pygame
+
+from allocations import ALLOCATIONS, allocations
+from benchmark import new_game, settle_pieces
+from results import write_json
+
+MemorySample = namedtuple('MemorySample', ['pieces', 'games', 'traced_bytes', 'peak_bytes', 'sprites',
+                                           'collections'] + list(ALLOCATIONS))
+
+
+def count_sprites():
+    # Sprites that are still reachable.  Anything waiting for the garbage collector is collected first.
+    gc.collect()
+    return sum(1 for item in gc.get_objects() if isinstance(item, pygame.sprite.Sprite))
+
+
+def run_memory_benchmark(pieces, sample_every, resolution=(800, 600), seed=0):
+    """
+        Play until pieces tetrominos have locked, starting a new game with the next seed whenever one is lost, and
+        return a sample every sample_every pieces.
+    """
+    gc.collect()
+    tracemalloc.start()
+    game = new_game(resolution, seed)
+    games = 1
+    played = 0
+    samples = []
+    allocated = dict(allocations)
+    while played < pieces:
+        target = min(pieces, played + sample_every)
+        while played < target:
+            locked = game.engine.pieces
+            # The bot only looks at the active tetromino so the run isn't dominated by tracing the search.
+            settle_pieces(game, locked + 1, lookahead=0)
+            game.draw()
+            played += game.engine.pieces - locked
+            if game.engine.lost:
+                games += 1
+                game.release_tetrominos()
+                game = new_game(resolution, seed + games - 1)
+
+        traced, peak = tracemalloc.get_traced_memory()
+        collections = sum(generation['collections'] for generation in gc.get_stats())
+        samples.append(MemorySample(played, games, traced, peak, count_sprites(), collections,
+                                    *(allocations[kind] - allocated[kind] for kind in ALLOCATIONS)))
+        allocated.update(allocations)
+        tracemalloc.reset_peak()
+    tracemalloc.stop()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sample the memory footprint of a long game.')
+    parser.add_argument('--pieces', type=int, default=10000)
+    parser.add_argument('--sample-every', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='JSON file, JSON to stdout when not given')
+    arguments = parser.parse_args()
+
+    # Game loads its assets from paths relative to the project folder.
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    pygame.init()
+
+    samples = run_memory_benchmark(arguments.pieces, arguments.sample_every, seed=arguments.seed)
+    for sample in samples:
+        print(f"pieces {sample.pieces:6}  games {sample.games:3}  traced {sample.traced_bytes / 1024:9.1f} KiB  "
+              f"peak {sample.peak_bytes / 1024:9.1f} KiB  sprites {sample.sprites:6}  gc {sample.collections}  "
+              f"made {sample.tetrominos} tetrominos {sample.blocks} blocks {sample.surfaces} surfaces",
+              file=sys.stderr)
+
+    write_json(samples, arguments.output, 'samples')
+
+
+if __name__ == '__main__':
+    main()
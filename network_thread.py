@@ -0,0 +1,81 @@
+"""
+    The network thread shared by the versus client and the spectator publisher.  Each runs its connection on an asyncio
+    event loop in a daemon thread, and the game loop hands it data through a bounded queue it never waits on, so a slow
+    or lost connection can't stall a frame.
+"""
+
+import asyncio
+import queue
+import threading
+
+
+class NetworkThread:
+    """
+        Runs connect() on an event loop in its own thread.  put() queues data for the network thread from the game loop
+        and returns False when it was dropped because the queue is full or the connection is gone.  Once connected,
+        connect() sends the queued data with write_outgoing().
+
+        Subclasses set up everything connect() uses before calling this __init__(), since it starts the thread.
+    """
+    def __init__(self, host, port, queue_size=64):
+        self.host = host
+        self.port = port
+        self.outgoing = queue.Queue(maxsize=queue_size)
+        self.closed = False
+        self.loop = asyncio.new_event_loop()
+        self.wakeup = None
+        self.task = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.task = self.loop.create_task(self.connect())
+        try:
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.closed = True
+            self.loop.close()
+
+    async def connect(self):
+        raise NotImplementedError
+
+    async def write_outgoing(self, writer, frame=bytes):
+        # Send everything in the queue as one write each time put() wakes the thread.  Anything put before the
+        # connection was made is waiting in the queue, so the first write goes out straight away.
+        self.wakeup = asyncio.Event()
+        self.wakeup.set()
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            data = bytearray()
+            while True:
+                try:
+                    data += frame(self.outgoing.get_nowait())
+                except queue.Empty:
+                    break
+            if data:
+                writer.write(data)
+                await writer.drain()
+
+    def put(self, data):
+        if self.closed:
+            return False
+        try:
+            self.outgoing.put_nowait(data)
+        except queue.Full:
+            return False
+        if self.wakeup is not None:
+            try:
+                self.loop.call_soon_threadsafe(self.wakeup.set)
+            except RuntimeError:
+                # The network thread has already stopped after the connection was closed.
+                return False
+        return True
+
+    def close(self):
+        if self.task is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.task.cancel)
+        self.thread.join(timeout=1)
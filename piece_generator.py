@@ -0,0 +1,76 @@
+"""
+    Seeded source of the tetromino sequence.  Every game gets its own generator so a seed always produces the same
+    sequence, no matter what else uses the random module.  Pieces are generated in bulk into a bytearray of shape
+    indices so drawing the next piece is an index lookup instead of a random call and a list allocation per spawn.
+"""
+
+from random import Random
+
+from shapes import SHAPES
+
+# 'random' picks every piece independently.  '7-bag' deals all seven shapes in a shuffled order before starting a new
+# bag, so no shape is ever more than twelve pieces away.
+RANDOMIZERS = ('random', '7-bag')
+
+
+class PieceGenerator:
+    def __init__(self, seed=None, randomizer='random', chunk_size=1024):
+        if randomizer not in RANDOMIZERS:
+            raise ValueError(f"Unknown randomizer {randomizer!r}, expected one of {RANDOMIZERS}")
+        self.seed = seed
+        self.randomizer = randomizer
+        self.chunk_size = chunk_size
+        self.random = Random(seed)
+
+        # Pieces generated ahead of time and the position of the next piece in them.  Pieces before the position have
+        # already been drawn and are dropped when the buffer is refilled.
+        self.buffer = bytearray()
+        self.position = 0
+        self.drawn = 0
+
+    def generate(self, count):
+        """
+            Returns the next count shape indices of the sequence as a bytearray.  In 7-bag mode whole bags are always
+            generated so the result can hold up to six extra pieces.
+        """
+        if self.randomizer == 'random':
+            return bytearray(self.random.choices(range(len(SHAPES)), k=count))
+
+        sequence = bytearray()
+        while len(sequence) < count:
+            # Every bag starts from the same order so the sequence doesn't depend on how many bags each call makes.
+            bag = list(range(len(SHAPES)))
+            self.random.shuffle(bag)
+            sequence.extend(bag)
+        return sequence
+
+    def pregenerate(self, count):
+        # Make sure at least count pieces are generated ahead of the next piece.
+        if len(self.buffer) - self.position < count:
+            del self.buffer[:self.position]
+            self.position = 0
+            self.buffer.extend(self.generate(max(count - len(self.buffer), self.chunk_size)))
+
+    def take(self, count):
+        # The next count shape indices as bytes, drawn the same as count calls to next_index().
+        self.pregenerate(count)
+        pieces = bytes(self.buffer[self.position:self.position + count])
+        self.position += count
+        self.drawn += count
+        return pieces
+
+    def next_index(self):
+        if self.position == len(self.buffer):
+            self.pregenerate(1)
+        index = self.buffer[self.position]
+        self.position += 1
+        self.drawn += 1
+        return index
+
+    def next_shape(self):
+        return SHAPES[self.next_index()]
+
+
+def generate_sequence(seed, count, randomizer='random'):
+    # The first count shape indices a new generator with the seed would produce.
+    return PieceGenerator(seed, randomizer).generate(count)[:count]
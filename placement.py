@@ -0,0 +1,264 @@
+"""
+    Finds every position a tetromino can lock in on a board and the board that results from each one.  This is the
+    inner loop of a bot, so boards are handled as tuples of the row bitmasks used by Board.row_masks and every
+    tetromino orientation is pre-built as row bitmasks too.  Collision and line clears are then a few integer
+    operations per row.
+"""
+
+from collections import deque, namedtuple
+
+from shapes import SHAPES, ROTATIONS
+
+Placement = namedtuple('Placement', ['shape', 'orientation', 'row', 'column', 'board', 'lines'])
+
+# Weight of a cleared line against the board evaluation when comparing placements.
+LINE_WEIGHT = 8.0
+
+
+def build_piece_tables():
+    """
+        For every shape, build the orientations that cover a different set of cells.  The 'O' has one, the 'S', 'Z'
+        and 'I' have two and the rest have four.  Each orientation holds its number, the bitmask of its cells in each
+        of its rows when placed in column zero, its width and height and, for each of its columns, the row of its
+        lowest and highest cells.
+    """
+    tables = {}
+    for shape in SHAPES:
+        seen = set()
+        orientations = []
+        for orientation, (cells, (width, height)) in enumerate(ROTATIONS[shape]):
+            if frozenset(cells) in seen:
+                continue
+            seen.add(frozenset(cells))
+
+            row_masks = [0] * height
+            bottoms = [0] * width
+            tops = [height] * width
+            for column, row in cells:
+                row_masks[row] |= 1 << column
+                bottoms[column] = max(bottoms[column], row)
+                tops[column] = min(tops[column], row)
+            orientations.append((orientation, tuple(row_masks), width, height, tuple(bottoms), tuple(tops)))
+        tables[shape] = tuple(orientations)
+    return tables
+
+
+PIECE_TABLES = build_piece_tables()
+
+
+def collides(board, row_masks, row, column, columns):
+    # Same rules as Board.collides for a piece given as row bitmasks with its top left corner at row and column.
+    if column < 0 or column + max(row_masks).bit_length() > columns or row + len(row_masks) > len(board):
+        return True
+    for index, mask in enumerate(row_masks):
+        if row + index >= 0 and board[row + index] & (mask << column):
+            return True
+    return False
+
+
+def lock(board, row_masks, row, column, columns):
+    """
+        Returns the board with the piece locked at row and column, and the number of lines it cleared.  Only the rows
+        the piece covers can have become full.
+    """
+    full_row_mask = (1 << columns) - 1
+    board = list(board)
+    lines = 0
+    for index, mask in enumerate(row_masks):
+        board[row + index] |= mask << column
+        if board[row + index] == full_row_mask:
+            lines += 1
+    if lines:
+        board = [0] * lines + [mask for mask in board if mask != full_row_mask]
+    return tuple(board), lines
+
+
+def column_surface(board, columns):
+    # The row of the highest occupied cell in each column, or the number of rows for an empty column.
+    surface = [len(board)] * columns
+    remaining = (1 << columns) - 1
+    for row, mask in enumerate(board):
+        found = mask & remaining
+        while found:
+            bit = found & -found
+            surface[bit.bit_length() - 1] = row
+            found ^= bit
+        remaining &= ~mask
+        if not remaining:
+            break
+    return surface
+
+
+def drop_placements(board, shape, columns):
+    """
+        Every placement reached by rotating the tetromino above the board, moving it to a column and letting it fall
+        straight down.  The landing row of each column comes from the height of the board's columns instead of
+        stepping the tetromino down one row at a time.
+    """
+    surface = column_surface(board, columns)
+    found = []
+    for orientation, row_masks, width, height, bottoms, _ in PIECE_TABLES[shape]:
+        for column in range(columns - width + 1):
+            row = min(surface[column + offset] - bottom for offset, bottom in enumerate(bottoms)) - 1
+            # A tetromino that can't fit below the top of the board loses the game instead of locking.
+            if row >= 0:
+                new_board, lines = lock(board, row_masks, row, column, columns)
+                found.append(Placement(shape, orientation, row, column, new_board, lines))
+    return found
+
+
+def reachable_placements(board, shape, columns, spawn_column=None):
+    """
+        Every placement the tetromino can reach from its spawn position with the engine's moves, rotations and
+        gravity, including sliding and rotating under overhangs.  Slower than drop_placements since it searches every
+        position the tetromino can pass through.
+    """
+    orientations = ROTATIONS[shape]
+    masks = []
+    for cells, (width, height) in orientations:
+        row_masks = [0] * height
+        for column, row in cells:
+            row_masks[row] |= 1 << column
+        masks.append(tuple(row_masks))
+
+    spawn_column = columns // 2 - 1 if spawn_column is None else spawn_column
+    start = (0, -len(masks[0]), spawn_column)
+    seen = {start}
+    queue = deque([start])
+    locked = {}
+    while queue:
+        orientation, row, column = queue.popleft()
+        neighbours = [(orientation, row, column - 1), (orientation, row, column + 1)]
+        if shape != 'O':
+            neighbours.append(((orientation + 1) % 4, row, column))
+
+        if collides(board, masks[orientation], row + 1, column, columns):
+            # Orientations that cover the same cells give the same placement so only the first one is kept.
+            cells = frozenset((row + index, column + bit)
+                              for index, mask in enumerate(masks[orientation])
+                              for bit in range(mask.bit_length()) if mask >> bit & 1)
+            if row >= 0 and cells not in locked:
+                new_board, lines = lock(board, masks[orientation], row, column, columns)
+                locked[cells] = Placement(shape, orientation, row, column, new_board, lines)
+        else:
+            neighbours.append((orientation, row + 1, column))
+
+        for state in neighbours:
+            if state not in seen and not collides(board, masks[state[0]], state[1], state[2], columns):
+                seen.add(state)
+                queue.append(state)
+    return list(locked.values())
+
+
+def count_holes(board):
+    # An empty cell is a hole when there is an occupied cell anywhere above it in the same column.
+    holes = 0
+    covered = 0
+    for mask in board:
+        holes += bin(covered & ~mask).count('1')
+        covered |= mask
+    return holes
+
+
+def evaluate_surface(surface, holes, rows, columns):
+    """
+        A simple score for how good a board is for the next pieces, from the top of each column and the number of
+        holes.  Lower stacks, fewer holes and flatter surfaces score higher.
+    """
+    aggregate_height = rows * columns - sum(surface)
+    bumpiness = 0
+    for index in range(columns - 1):
+        bumpiness += abs(surface[index] - surface[index + 1])
+    return -0.5 * aggregate_height - 4.0 * holes - 0.3 * bumpiness
+
+
+def evaluate_board(board, columns):
+    return evaluate_surface(column_surface(board, columns), count_holes(board), len(board), columns)
+
+
+def scored_drops(board, surface, holes, shape, columns):
+    """
+        Score every drop placement of the shape without building the boards they lead to.  When a placement clears no
+        lines, the new column tops and hole count follow from the old ones and the cells the tetromino covers: every
+        empty cell between the bottom of the tetromino and the old top of a column becomes a hole.  Only placements
+        that clear lines build their board to evaluate it.  Yields the score, the placement with its board set to None
+        when it wasn't built, and the new column tops and hole count.
+    """
+    rows = len(board)
+    full_row_mask = (1 << columns) - 1
+    for orientation, row_masks, width, height, bottoms, tops in PIECE_TABLES[shape]:
+        for column in range(columns - width + 1):
+            row = min(surface[column + offset] - bottom for offset, bottom in enumerate(bottoms)) - 1
+            if row < 0:
+                continue
+
+            lines = 0
+            for index, mask in enumerate(row_masks):
+                if board[row + index] | mask << column == full_row_mask:
+                    lines += 1
+
+            if lines:
+                new_board, _ = lock(board, row_masks, row, column, columns)
+                new_surface = column_surface(new_board, columns)
+                new_holes = count_holes(new_board)
+            else:
+                new_board = None
+                new_surface = surface[:]
+                new_holes = holes
+                for offset in range(width):
+                    new_holes += surface[column + offset] - row - bottoms[offset] - 1
+                    new_surface[column + offset] = row + tops[offset]
+
+            score = LINE_WEIGHT * lines + evaluate_surface(new_surface, new_holes, rows, columns)
+            yield score, Placement(shape, orientation, row, column, new_board, lines), new_surface, new_holes
+
+
+def placement_masks(placement):
+    for orientation, row_masks, *_ in PIECE_TABLES[placement.shape]:
+        if orientation == placement.orientation:
+            return row_masks
+
+
+def best_placement(board, shapes, columns, evaluate=None, beam_width=2):
+    """
+        Search the drop placements of the first shape with a lookahead over the rest of the shapes, such as the active
+        tetromino followed by the queue.  Only the beam_width best placements at each level are searched deeper.
+        Boards are scored with evaluate_surface and updated incrementally unless an evaluate(board, columns) function
+        is given, in which case every placement's board is built and passed to it.  Returns the best placement of the
+        first shape with its board, or None when every placement loses the game.
+    """
+    def candidates(board, surface, holes, shape):
+        if evaluate is None:
+            return list(scored_drops(board, surface, holes, shape, columns))
+        return [(LINE_WEIGHT * placement.lines + evaluate(placement.board, columns), placement, None, None)
+                for placement in drop_placements(board, shape, columns)]
+
+    def value(board, surface, holes, depth):
+        scored = candidates(board, surface, holes, shapes[depth])
+        if not scored:
+            return float('-inf'), None
+        scored.sort(key=lambda item: item[0], reverse=True)
+        if depth == len(shapes) - 1:
+            return scored[0][0], scored[0][1]
+
+        best = (float('-inf'), None)
+        for score, placement, new_surface, new_holes in scored[:beam_width]:
+            if placement.board is None:
+                placement = placement._replace(board=lock(board, placement_masks(placement), placement.row,
+                                                          placement.column, columns)[0])
+            if new_surface is None:
+                new_surface = column_surface(placement.board, columns)
+                new_holes = count_holes(placement.board)
+            future, _ = value(placement.board, new_surface, new_holes, depth + 1)
+            total = LINE_WEIGHT * placement.lines + future
+            if best[1] is None or total > best[0]:
+                best = (total, placement)
+        return best
+
+    board = tuple(board)
+    placement = value(board, column_surface(board, columns), count_holes(board), 0)[1]
+    if placement is not None and placement.board is None:
+        placement = placement._replace(board=lock(board, placement_masks(placement), placement.row,
+                                                  placement.column, columns)[0])
+    return placement
+
@@ -2,14 +2,16 @@ import pygame
 
 
 class PlayArea:
-    def __init__(self, display_width, display_height):
+    def __init__(self, display_width, display_height, rows=13, columns=10):
         # Since 16:9 aspect ratio is the most common for computer monitors, the width aspect has more flexibility due
         # to having more pixels to work with. This means the decision on appearance gets based off of height first.
         # In this case, the height of the play area takes up 70% of the window's height with 20% of the window above it
-        # and 10% below it.
-        self.rows = 13
-        self.columns = 10
-        self.cell_size = round(display_height * 0.7) // self.rows
+        # and 10% below it.  A wide board is limited to half of the window's width instead so the score, controls and
+        # tetromino queue still fit beside it, which makes its cells smaller and the play area shorter.
+        self.rows = rows
+        self.columns = columns
+        self.cell_size = max(1, min(round(display_height * 0.7) // self.rows,
+                                    round(display_width * 0.5) // self.columns))
         self.margin = 4
         surface_width = self.cell_size * self.columns + self.margin
         surface_height = self.cell_size * self.rows + (self.margin // 2)
@@ -0,0 +1,17 @@
+class SurfaceCache:
+    """
+        Holds surfaces and fonts that only need to be rebuilt when the values they are drawn from change.  Each entry
+        is stored under a name together with the key it was built from, such as the window size or the score.  When
+        the entry is requested with a different key it is rebuilt and the old one is replaced, so an entry like the
+        score label only ever holds its latest surface.
+    """
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, name, key, build):
+        entry = self.entries.get(name)
+        if entry is None or entry[0] != key:
+            entry = (key, build())
+            self.entries[name] = entry
+        return entry[1]
+
@@ -0,0 +1,230 @@
+"""
+    Compact binary replays.  A replay starts with a header holding everything needed to rebuild the engine, including
+    the seed, and is followed by one event for every accepted action, gravity step and garbage push.  Each event is a
+    single variable-length integer holding the milliseconds since the previous event and the event code, which makes
+    most events one or two bytes.  A garbage event is followed by two more for the number of lines and the hole column.
+    Events are written as they happen and can be read back while the file is still growing.  Play a recorded game
+    back, or check it without a display and print how it ended:
+
+        python replay.py replays/game.ttr --speed 2
+        python replay.py replays/game.ttr --headless
+"""
+
+import argparse
+import os
+import struct
+from collections import namedtuple
+
+from engine import GameEngine
+from piece_generator import RANDOMIZERS
+
+MAGIC = b'TTRP'
+VERSION = 2
+# Magic, version, randomizer, rows, columns, queue size, gravity interval, movement cooldown and seed.
+HEADER = struct.Struct('<4sBBBBBHHq')
+
+EVENTS = ('left', 'right', 'rotate', 'gravity', 'hard_drop', 'garbage')
+# The number of values that follow each event code.
+EVENT_VALUES = {'garbage': 2}
+EVENT_BITS = 3
+# Version 1 replays were recorded before hard drops and use two bits for the event code.
+VERSION_EVENT_BITS = {1: 2, 2: EVENT_BITS}
+
+ReplayHeader = namedtuple('ReplayHeader', ['randomizer', 'rows', 'columns', 'queue_size', 'gravity_interval',
+                                           'movement_cooldown', 'seed'])
+ReplayEvent = namedtuple('ReplayEvent', ['time', 'event', 'values'], defaults=((),))
+
+
+def encode_varint(value):
+    # Seven bits per byte with the high bit set on every byte but the last.
+    encoded = bytearray()
+    while value > 0x7f:
+        encoded.append(value & 0x7f | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return encoded
+
+
+class ReplayWriter:
+    """
+        Records an engine's events to a binary file object.  The header is written straight away and every event is
+        appended when the engine reports it.  The engine has to have a seeded piece generator since the seed is the
+        only record of the tetromino sequence.
+    """
+    def __init__(self, stream, engine):
+        generator = engine.generator
+        if generator.seed is None or not isinstance(generator.seed, int):
+            raise ValueError("Recording a replay needs an engine with an integer seed")
+        self.stream = stream
+        self.time = 0
+        self.stream.write(HEADER.pack(MAGIC, VERSION, RANDOMIZERS.index(generator.randomizer), engine.board.rows,
+                                      engine.board.columns, len(engine.queue), engine.gravity_interval,
+                                      engine.movement_cooldown, generator.seed))
+        engine.recorder = self
+
+    def record(self, now, event, values=()):
+        # An event without a time, such as a gravity step from a timer, is recorded at the time of the last event.
+        if now is None or now < self.time:
+            now = self.time
+        encoded = encode_varint((now - self.time) << EVENT_BITS | EVENTS.index(event))
+        for value in values:
+            encoded += encode_varint(value)
+        self.stream.write(encoded)
+        self.time = now
+
+    def flush(self):
+        self.stream.flush()
+
+
+class ReplayReader:
+    """
+        Reads a replay from a binary file object.  read_events() returns the events that are complete in the data read
+        so far and keeps any partial event, so it can be called again after more of a replay that is still being
+        recorded has been written.
+    """
+    def __init__(self, stream, chunk_size=4096):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        data = stream.read(HEADER.size)
+        if len(data) < HEADER.size:
+            raise ValueError("Replay is too short to hold a header")
+        magic, version, randomizer, *fields = HEADER.unpack(data)
+        if magic != MAGIC or version not in VERSION_EVENT_BITS:
+            raise ValueError(f"Not a version {VERSION} replay or older")
+        self.header = ReplayHeader(RANDOMIZERS[randomizer], *fields)
+        self.event_bits = VERSION_EVENT_BITS[version]
+
+        self.time = 0
+        self.value = 0
+        self.shift = 0
+        # An event still waiting for the values that follow it, and those values.
+        self.pending = None
+        self.values = []
+
+    def read_events(self):
+        events = []
+        data = self.stream.read(self.chunk_size)
+        while data:
+            for byte in data:
+                self.value |= (byte & 0x7f) << self.shift
+                if byte & 0x80:
+                    self.shift += 7
+                    continue
+                value = self.value
+                self.value = 0
+                self.shift = 0
+                if self.pending is not None:
+                    self.values.append(value)
+                    if len(self.values) == EVENT_VALUES[self.pending]:
+                        events.append(ReplayEvent(self.time, self.pending, tuple(self.values)))
+                        self.pending = None
+                        self.values = []
+                    continue
+
+                self.time += value >> self.event_bits
+                event = EVENTS[value & (1 << self.event_bits) - 1]
+                if event in EVENT_VALUES:
+                    self.pending = event
+                else:
+                    events.append(ReplayEvent(self.time, event))
+            data = self.stream.read(self.chunk_size)
+        return events
+
+    def __iter__(self):
+        return iter(self.read_events())
+
+    def create_engine(self):
+        header = self.header
+        return GameEngine(header.rows, header.columns, seed=header.seed, gravity_interval=header.gravity_interval,
+                          movement_cooldown=header.movement_cooldown, queue_size=header.queue_size,
+                          randomizer=header.randomizer)
+
+
+def apply_event(engine, event):
+    if event.event == 'gravity':
+        engine.drop(event.time)
+    elif event.event == 'garbage':
+        engine.add_garbage(*event.values, event.time)
+    else:
+        engine.handle_action(event.event, event.time)
+
+
+def replay_headless(stream):
+    """
+        Re-run a replay as fast as possible without a display.  Returns the engine in the state the replay ends in.
+    """
+    reader = ReplayReader(stream)
+    engine = reader.create_engine()
+    for event in reader:
+        apply_event(engine, event)
+    return engine
+
+
+def play_replay(stream, window, speed=1.0, fps=60):
+    """
+        Draw a replay on the window at speed times the speed it was recorded at.  Returns the Game when the replay
+        ends, or None if the window was closed.
+    """
+    import pygame
+    from game import Game
+
+    reader = ReplayReader(stream)
+    header = reader.header
+    game = Game(window, seed=header.seed, randomizer=header.randomizer, rows=header.rows, columns=header.columns)
+    events = reader.read_events()
+    if not events:
+        return game
+
+    clock = pygame.time.Clock()
+    # Start the replay clock at the first event so time spent in the menu before the game isn't waited out.
+    replay_time = events[0].time
+    index = 0
+    while index < len(events):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return None
+
+        replay_time += clock.tick(fps) * speed
+        while index < len(events) and events[index].time <= replay_time:
+            if events[index].event == 'gravity':
+                game.move_down_active_tetromino(events[index].time)
+            elif events[index].event == 'garbage':
+                game.add_garbage(*events[index].values, events[index].time)
+            else:
+                game.apply_action(events[index].event, events[index].time)
+            index += 1
+
+        game.draw()
+        pygame.display.update()
+    return game
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play back a recorded replay, or check it without a display.')
+    parser.add_argument('path')
+    parser.add_argument('--headless', action='store_true', help='re-run the replay and print how the game ended')
+    parser.add_argument('--speed', type=float, default=1.0, help='playback speed relative to the recording')
+    parser.add_argument('--fps', type=int, default=60)
+    arguments = parser.parse_args()
+
+    with open(arguments.path, 'rb') as file:
+        if arguments.headless:
+            engine = replay_headless(file)
+            print(f"score {engine.score}  lines {engine.lines}  pieces {engine.pieces}  lost {engine.lost}")
+            return
+
+        import pygame
+
+        # Game loads its assets from paths relative to the project folder.
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+        pygame.init()
+        window = pygame.display.set_mode((800, 600))
+        pygame.display.set_caption("Tetris Project replay")
+        game = play_replay(file, window, arguments.speed, arguments.fps)
+        if game is not None:
+            print(f"score {game.score}  lines {game.engine.lines}  pieces {game.engine.pieces}  lost {game.lost}")
+        pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+    Helpers shared by the command line benchmarks and load tests for summarizing their measurements and writing them
+    out.  Nothing here imports pygame, so a headless tool can use it without starting SDL.
+"""
+
+import json
+import math
+import os
+import platform
+import sys
+import time
+
+
+def percentile(values, percent):
+    # Nearest rank percentile of the values, or zero when there are none.
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(percent / 100 * len(ordered)) - 1))]
+
+
+def metadata():
+    # Where and when the measurements were taken.  The pygame and SDL versions are only known when the tool measured
+    # something that uses pygame.
+    info = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform()}
+    pygame = sys.modules.get('pygame')
+    if pygame is not None:
+        info['pygame'] = pygame.version.ver
+        info['sdl'] = '.'.join(map(str, pygame.get_sdl_version()))
+        info['video_driver'] = os.environ.get('SDL_VIDEODRIVER')
+    return info
+
+
+def write_json(records, path, key='results'):
+    # The namedtuple records under key, next to the metadata, written to the path or to stdout when it's None.
+    document = json.dumps({'metadata': metadata(), key: [record._asdict() for record in records]}, indent=1)
+    if path is None:
+        print(document)
+    else:
+        with open(path, 'w') as file:
+            file.write(document)
@@ -0,0 +1,70 @@
+"""
+    Shape data for the seven tetrominos.  Nothing in this module depends on pygame so the tables can be shared by the
+    sprites and by anything that works on the board alone.
+"""
+
+# The seven tetromino shapes.  A shape's position in this tuple plus one is the color index stored on the board.
+SHAPES = ('I', 'J', 'L', 'O', 'S', 'T', 'Z')
+
+SHAPE_PATTERNS = {
+    'I': ['x',
+          'x',
+          'x',
+          'x'],
+    'L': ['x ',
+          'x ',
+          'xx'],
+    'J': [' x',
+          ' x',
+          'xx'],
+    'O': ['xx',
+          'xx'],
+    'S': [' xx',
+          'xx '],
+    'T': ['xxx',
+          ' x '],
+    'Z': ['xx ',
+          ' xx']}
+
+COLORS = {
+    'I': (4, 252, 252),
+    'L': (255, 128, 0),
+    'J': (0, 0, 255),
+    'O': (255, 255, 0),
+    'S': (0, 255, 0),
+    'T': (255, 0, 255),
+    'Z': (255, 0, 0)}
+
+# Garbage rows sent by the opponent in a versus game are stored on the board with the color index after the shapes'.
+GARBAGE = len(SHAPES) + 1
+GARBAGE_COLOR = (128, 128, 128)
+
+
+def build_rotation_table():
+    """
+        Build the cells of every shape in each of its four orientations.  Orientation zero is the pattern above and
+        each following orientation is a 90-degree counterclockwise rotation of the one before it, pivoting so the top
+        left corner of the bounding box stays in place.  Cells are (column, row) offsets from that corner and keep the
+        same order in every orientation so the nth cell always belongs to the same block.
+    """
+    table = {}
+    for shape, pattern in SHAPE_PATTERNS.items():
+        cells = tuple((column, row) for row, line in enumerate(pattern)
+                      for column, character in enumerate(line) if character == 'x')
+        width = len(pattern[0])
+        height = len(pattern)
+
+        orientations = []
+        for _ in range(4):
+            orientations.append((cells, (width, height)))
+
+            # 90-degree counterclockwise rotation of a cell inside the bounding box.  The column becomes the row
+            # counted up from the bottom and the row becomes the column.
+            cells = tuple((row, width - 1 - column) for column, row in cells)
+            width, height = height, width
+        table[shape] = tuple(orientations)
+    return table
+
+
+# ROTATIONS[shape][orientation] holds the (cells, (width, height)) of the shape in that orientation.
+ROTATIONS = build_rotation_table()
@@ -0,0 +1,355 @@
+"""
+    Live spectator stream of a game.  Every frame the game's state is encoded as a compact binary delta of what changed
+    since the frame before: the board cells that changed, the rows cleared by a lock, the active tetromino's pose, the
+    queue and the score.  A keyframe with the whole state goes out at a fixed interval so spectators can join at any
+    time and recover from a lost message.  A fan-out server relays the stream of one game to every subscriber, sending
+    each message to all of them as the same bytes, so the cost of encoding doesn't grow with the number of spectators.
+    Run the server with:
+
+        python spectator.py --host 0.0.0.0 --port 7778
+
+    and set SPECTATOR_SERVER in main.py to its address.  spectator_load_test.py measures the server with hundreds of
+    subscribers.
+"""
+
+import argparse
+import asyncio
+
+from network_thread import NetworkThread
+from replay import encode_varint
+from shapes import SHAPES
+
+PORT = 7778
+
+# The first byte sent on a connection to the server says whether it publishes the stream or subscribes to it.
+PUBLISHER = b'P'
+SUBSCRIBER = b'S'
+
+# Bits of the first byte of a message, which say what kind of message it is and which parts it holds.
+KEYFRAME = 0x01
+CLEARED_ROWS = 0x02
+CELLS = 0x04
+POSE = 0x08
+QUEUE = 0x10
+SCORE = 0x20
+LOST = 0x40
+
+
+def read_varint(data, offset):
+    # Decode a variable-length integer written by encode_varint().  Returns the value and the offset after it.
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, offset
+        shift += 7
+
+
+def encode_signed(value):
+    # Zigzag encoding keeps small negative numbers, such as the row of a tetromino above the board, to one byte.
+    return encode_varint(value << 1 if value >= 0 else (-value << 1) - 1)
+
+
+def read_signed(data, offset):
+    value, offset = read_varint(data, offset)
+    return (value >> 1) ^ -(value & 1), offset
+
+
+def frame_message(message):
+    # Messages are sent with their length in front of them.
+    return bytes(encode_varint(len(message)) + message)
+
+
+def split_messages(buffer):
+    # Split the complete length-prefixed messages off the front of a bytearray, leaving any partial message in it.
+    messages = []
+    offset = 0
+    while offset < len(buffer):
+        try:
+            length, start = read_varint(buffer, offset)
+        except IndexError:
+            break
+        if start + length > len(buffer):
+            break
+        messages.append(bytes(buffer[start:start + length]))
+        offset = start + length
+    del buffer[:offset]
+    return messages
+
+
+def clear_rows(colors, rows, columns):
+    # The same change to a flat color array that Board.clear_rows() makes to the board.
+    for row in sorted(rows):
+        start = row * columns
+        del colors[start:start + columns]
+        colors[0:0] = bytes(columns)
+
+
+class SnapshotEncoder:
+    """
+        Encodes an engine's state into one message per frame.  The encoder keeps a copy of the state the spectators
+        have, so each delta only holds what is different from it.  A line clear is sent as the rows it cleared, which
+        the spectators apply to their own copy of the board, rather than as every cell that moved down.  Every
+        keyframe_interval frames, and whenever keyframe is set, the whole state is sent instead.
+    """
+    def __init__(self, keyframe_interval=120):
+        self.keyframe_interval = keyframe_interval
+        self.keyframe = True
+        self.frame = 0
+        self.colors = None
+        self.pieces = None
+        self.pose = None
+        self.queue = None
+        self.score = None
+
+    def encode(self, engine):
+        board = engine.board
+        keyframe = self.keyframe or self.frame % self.keyframe_interval == 0 or len(self.colors) != len(board.colors)
+        self.keyframe = False
+        pose = (SHAPES.index(engine.active_shape), engine.orientation, engine.row, engine.column)
+        shapes = bytes(SHAPES.index(shape) for shape in engine.queue)
+
+        flags = LOST if engine.lost else 0
+        body = bytearray()
+        if keyframe:
+            flags |= KEYFRAME | POSE | QUEUE | SCORE
+            body += encode_varint(board.rows) + encode_varint(board.columns) + board.colors
+            self.colors = bytearray(board.colors)
+        else:
+            # A single lock since the last frame can only have cleared the rows in last_clear.  After more than one,
+            # or a new game, the changed cells are sent as they are.
+            if engine.pieces == self.pieces + 1 and engine.last_clear:
+                cleared = [row for row, _ in engine.last_clear]
+                flags |= CLEARED_ROWS
+                body += encode_varint(len(cleared))
+                for row in cleared:
+                    body += encode_varint(row)
+                clear_rows(self.colors, cleared, board.columns)
+
+            changes = self.changed_cells(board)
+            if changes:
+                flags |= CELLS
+                body += encode_varint(len(changes))
+                previous = 0
+                for index, color in changes:
+                    # Changed cells are in order so each index is sent as the gap since the one before it.
+                    body += encode_varint(index - previous)
+                    body.append(color)
+                    previous = index
+
+            if pose != self.pose:
+                flags |= POSE
+            if shapes != self.queue:
+                flags |= QUEUE
+            if engine.score != self.score:
+                flags |= SCORE
+
+        if flags & POSE:
+            body += bytes(pose[:2]) + encode_signed(pose[2]) + encode_varint(pose[3])
+        if flags & QUEUE:
+            body += encode_varint(len(shapes)) + shapes
+        if flags & SCORE:
+            body += encode_varint(engine.score)
+
+        self.pose = pose
+        self.queue = shapes
+        self.score = engine.score
+        self.pieces = engine.pieces
+        message = bytes([flags]) + encode_varint(self.frame) + body
+        self.frame += 1
+        return message
+
+    def changed_cells(self, board):
+        # The cells that differ from the spectators' copy of the board, found a row at a time, and the copy brought up
+        # to date.
+        colors = board.colors
+        changes = []
+        if colors == self.colors:
+            return changes
+        columns = board.columns
+        for start in range(0, len(colors), columns):
+            end = start + columns
+            if colors[start:end] != self.colors[start:end]:
+                for index in range(start, end):
+                    if colors[index] != self.colors[index]:
+                        changes.append((index, colors[index]))
+        self.colors[:] = colors
+        return changes
+
+
+class SnapshotDecoder:
+    """
+        Rebuilds a game's state from its spectator stream.  Deltas are ignored until the first keyframe, and again
+        after a message is missed, since a delta only makes sense on top of every message before it.
+    """
+    def __init__(self):
+        self.frame = None
+        self.rows = 0
+        self.columns = 0
+        self.colors = None
+        self.pose = None
+        self.queue = ()
+        self.score = 0
+        self.lost = False
+
+    @property
+    def synced(self):
+        return self.frame is not None
+
+    def apply(self, message):
+        # Apply one message.  Returns True when it was applied.
+        flags = message[0]
+        frame, offset = read_varint(message, 1)
+        if flags & KEYFRAME:
+            self.rows, offset = read_varint(message, offset)
+            self.columns, offset = read_varint(message, offset)
+            end = offset + self.rows * self.columns
+            self.colors = bytearray(message[offset:end])
+            offset = end
+        elif self.frame is None or frame != self.frame + 1:
+            self.frame = None
+            return False
+
+        if flags & CLEARED_ROWS:
+            count, offset = read_varint(message, offset)
+            rows = []
+            for _ in range(count):
+                row, offset = read_varint(message, offset)
+                rows.append(row)
+            clear_rows(self.colors, rows, self.columns)
+        if flags & CELLS:
+            count, offset = read_varint(message, offset)
+            index = 0
+            for _ in range(count):
+                gap, offset = read_varint(message, offset)
+                index += gap
+                self.colors[index] = message[offset]
+                offset += 1
+        if flags & POSE:
+            shape, orientation = message[offset], message[offset + 1]
+            row, offset = read_signed(message, offset + 2)
+            column, offset = read_varint(message, offset)
+            self.pose = (SHAPES[shape], orientation, row, column)
+        if flags & QUEUE:
+            count, offset = read_varint(message, offset)
+            self.queue = tuple(SHAPES[shape] for shape in message[offset:offset + count])
+            offset += count
+        if flags & SCORE:
+            self.score, offset = read_varint(message, offset)
+
+        self.lost = bool(flags & LOST)
+        self.frame = frame
+        return True
+
+
+class SpectatorServer:
+    """
+        Relays the stream from one publisher to every subscriber.  A new subscriber is sent the last keyframe and the
+        deltas since it, so it starts in sync.  Messages are written to subscribers without waiting for them, and a
+        subscriber with more than buffer_limit bytes still waiting to be sent is skipped until the next keyframe, so
+        one slow spectator can't hold up the others or make the server's memory grow.
+    """
+    def __init__(self, buffer_limit=256 * 1024):
+        self.buffer_limit = buffer_limit
+        # Each subscriber's writer and whether it is waiting for a keyframe.
+        self.subscribers = {}
+        self.catch_up = []
+        self.messages = 0
+        self.bytes_sent = 0
+
+    async def handle_connection(self, reader, writer):
+        try:
+            role = await reader.readexactly(1)
+            if role == PUBLISHER:
+                await self.read_stream(reader)
+            elif role == SUBSCRIBER:
+                for message in self.catch_up:
+                    writer.write(message)
+                self.subscribers[writer] = not self.catch_up
+                # Subscribers don't send anything, so this only returns when they disconnect.
+                while await reader.read(4096):
+                    pass
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.subscribers.pop(writer, None)
+            writer.close()
+
+    async def read_stream(self, reader):
+        buffer = bytearray()
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                return
+            buffer += data
+            for message in split_messages(buffer):
+                self.broadcast(message)
+
+    def broadcast(self, message):
+        keyframe = message[0] & KEYFRAME
+        framed = frame_message(message)
+        if keyframe:
+            self.catch_up = [framed]
+        elif self.catch_up:
+            self.catch_up.append(framed)
+
+        self.messages += 1
+        for writer, waiting in self.subscribers.items():
+            if waiting:
+                if not keyframe:
+                    continue
+                self.subscribers[writer] = False
+            elif writer.transport.get_write_buffer_size() > self.buffer_limit:
+                self.subscribers[writer] = True
+                continue
+            writer.write(framed)
+            self.bytes_sent += len(framed)
+
+    async def serve(self, host='127.0.0.1', port=PORT):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+class SpectatorPublisher(NetworkThread):
+    """
+        Sends a game's spectator stream to a spectator server from a network thread, so the game loop never waits on
+        the connection.  publish() returns False when the bounded queue to the network thread is full and the message
+        was dropped, in which case the next message has to be a keyframe.
+    """
+    def __init__(self, host='127.0.0.1', port=PORT, queue_size=64):
+        super().__init__(host, port, queue_size)
+
+    async def connect(self):
+        try:
+            _, writer = await asyncio.open_connection(self.host, self.port)
+        except OSError:
+            return
+        writer.write(PUBLISHER)
+        try:
+            await self.write_outgoing(writer, frame_message)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def publish(self, message):
+        return self.put(message)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relay a game's spectator stream to every subscriber.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=PORT)
+    arguments = parser.parse_args()
+    try:
+        asyncio.run(SpectatorServer().serve(arguments.host, arguments.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
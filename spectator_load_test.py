@@ -0,0 +1,175 @@
+"""
+    Load test of the spectator server.  A local server is started in its own process and a bot game is streamed to it
+    at the game's frame rate while a growing number of simulated spectators subscribe.  For each number of spectators
+    the test reports the server's CPU time, the bytes sent to each spectator and how long messages took to arrive.
+    Flat CPU time per message per spectator and flat bytes per spectator mean the stream scales with the audience.
+    A few of the spectators decode every message and are checked against the game's final state.
+
+        python spectator_load_test.py --subscribers 1 100 500 --seconds 10
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import sys
+import time
+from collections import namedtuple
+from random import Random
+
+from engine import GameEngine
+from results import percentile, write_json
+from spectator import (SpectatorServer, SnapshotEncoder, SnapshotDecoder, PUBLISHER, SUBSCRIBER, KEYFRAME,
+                       frame_message, split_messages, read_varint)
+from tournament import GreedyPolicy
+
+LoadResult = namedtuple('LoadResult', ['subscribers', 'frames', 'keyframe_bytes', 'delta_bytes', 'server_cpu_ms',
+                                       'cpu_us_per_delivery', 'bytes_per_subscriber_per_second', 'latency_p50_ms',
+                                       'latency_p95_ms', 'latency_p99_ms', 'delivered', 'in_sync'])
+
+
+def run_server(port, ready, stop, results):
+    # The server process.  Its CPU time and counters are sent back once the parent sets stop.
+    async def serve():
+        server = SpectatorServer()
+        listener = await asyncio.start_server(server.handle_connection, '127.0.0.1', port)
+        ready.set()
+        start = time.process_time()
+        await asyncio.get_running_loop().run_in_executor(None, stop.wait)
+        results.put((time.process_time() - start, server.messages, server.bytes_sent))
+        listener.close()
+
+    asyncio.run(serve())
+
+
+class Subscriber:
+    # A simulated spectator.  Every one of them times when each message arrives and some also decode the messages.
+    def __init__(self, decode):
+        self.decoder = SnapshotDecoder() if decode else None
+        self.arrivals = {}
+        self.bytes = 0
+
+    async def run(self, port):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(SUBSCRIBER)
+        buffer = bytearray()
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    return
+                arrived = time.perf_counter()
+                self.bytes += len(data)
+                buffer += data
+                for message in split_messages(buffer):
+                    frame, _ = read_varint(message, 1)
+                    self.arrivals[frame] = arrived
+                    if self.decoder is not None:
+                        self.decoder.apply(message)
+        finally:
+            writer.close()
+
+
+async def publish(port, seconds, fps, seed, sent):
+    """
+        Play a bot game for the given number of seconds at fps frames per second and stream it to the server.  Returns
+        the engine the game ended with and the sizes of the keyframes and deltas.
+    """
+    _, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(PUBLISHER)
+    encoder = SnapshotEncoder()
+    policy = GreedyPolicy()
+    rng = Random(seed)
+    engine = GameEngine(seed=seed, movement_cooldown=0)
+    sizes = {True: [], False: []}
+    frame_time = 1 / fps
+    start = time.perf_counter()
+    for frame in range(int(seconds * fps)):
+        if engine.lost:
+            seed += 1
+            engine = GameEngine(seed=seed, movement_cooldown=0)
+            policy = GreedyPolicy()
+        now = round(frame * 1000 / fps)
+        engine.update(now, policy(engine, rng))
+
+        message = encoder.encode(engine)
+        sizes[bool(message[0] & KEYFRAME)].append(len(message))
+        sent[encoder.frame - 1] = time.perf_counter()
+        writer.write(frame_message(message))
+        await writer.drain()
+        await asyncio.sleep(max(0.0, start + (frame + 1) * frame_time - time.perf_counter()))
+    writer.close()
+    return engine, sizes
+
+
+async def run_load(port, subscribers, seconds, fps, seed, decoders):
+    tasks = []
+    clients = [Subscriber(index < decoders) for index in range(subscribers)]
+    for client in clients:
+        tasks.append(asyncio.create_task(client.run(port)))
+    # Let every subscriber connect before the game starts.
+    await asyncio.sleep(0.5)
+
+    sent = {}
+    engine, sizes = await publish(port, seconds, fps, seed, sent)
+    await asyncio.sleep(0.5)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return engine, sizes, sent, clients
+
+
+def load_test(subscribers, seconds=5.0, fps=60, seed=0, decoders=5, port=7790):
+    ready = multiprocessing.Event()
+    stop = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    server = multiprocessing.Process(target=run_server, args=(port, ready, stop, results), daemon=True)
+    server.start()
+    ready.wait(10)
+
+    engine, sizes, sent, clients = asyncio.run(run_load(port, subscribers, seconds, fps, seed, decoders))
+    stop.set()
+    server_cpu, messages, bytes_sent = results.get(timeout=10)
+    server.join(5)
+
+    latencies = [(arrived - sent[frame]) * 1000 for client in clients for frame, arrived in client.arrivals.items()
+                 if frame in sent]
+    delivered = sum(len(client.arrivals) for client in clients)
+    state = (bytes(engine.board.colors), engine.score, tuple(engine.queue))
+    in_sync = sum(1 for client in clients if client.decoder is not None and
+                  (bytes(client.decoder.colors), client.decoder.score, client.decoder.queue) == state)
+    return LoadResult(subscribers, messages,
+                      sum(sizes[True]) / max(1, len(sizes[True])),
+                      sum(sizes[False]) / max(1, len(sizes[False])),
+                      server_cpu * 1000,
+                      server_cpu * 1e6 / max(1, delivered),
+                      bytes_sent / subscribers / seconds,
+                      percentile(latencies, 50), percentile(latencies, 95), percentile(latencies, 99),
+                      delivered, f'{in_sync}/{min(decoders, subscribers)}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the spectator server with simulated subscribers.')
+    parser.add_argument('--subscribers', type=int, nargs='+', default=[1, 100, 250, 500])
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--fps', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--decoders', type=int, default=5, help='subscribers that decode and check every message')
+    parser.add_argument('--port', type=int, default=7790)
+    parser.add_argument('--output', default=None, help='JSON file, JSON to stdout when not given')
+    arguments = parser.parse_args()
+
+    results = []
+    for subscribers in arguments.subscribers:
+        result = load_test(subscribers, arguments.seconds, arguments.fps, arguments.seed, arguments.decoders,
+                           arguments.port)
+        print(f"subscribers {result.subscribers:5}  server cpu {result.server_cpu_ms:8.1f} ms  "
+              f"{result.cpu_us_per_delivery:6.2f} us/delivery  {result.bytes_per_subscriber_per_second:8.1f} B/s each  "
+              f"latency p50 {result.latency_p50_ms:6.2f} p95 {result.latency_p95_ms:6.2f} ms  in sync {result.in_sync}",
+              file=sys.stderr)
+        results.append(result)
+
+    write_json(results, arguments.output)
+
+
+if __name__ == '__main__':
+    main()
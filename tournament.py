@@ -0,0 +1,124 @@
+"""
+    Runs many seeded games of the engine in parallel to compare placement policies.  Each game is played headlessly by
+    a policy on a GameEngine and the results stream back as the worker processes finish them.
+
+    Run from the command line to print one CSV line per finished game:
+
+        python tournament.py --policy random --games 1000 --workers 8
+"""
+
+import argparse
+import csv
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from random import Random
+
+from engine import GameEngine, ACTIONS
+from piece_generator import RANDOMIZERS
+from placement import best_placement
+
+GameResult = namedtuple('GameResult', ['policy', 'seed', 'score', 'lines', 'pieces', 'duration', 'wall_time'])
+
+
+class RandomPolicy:
+    # Press a random key, or nothing, every tick.
+    def __call__(self, engine, rng):
+        return [rng.choice(ACTIONS + (None,))]
+
+
+class GreedyPolicy:
+    """
+        Picks the best drop placement for each new tetromino with a lookahead over the queue, then rotates and moves
+        the tetromino toward it one action per tick and lets gravity bring it down.
+    """
+    def __init__(self):
+        self.piece = None
+        self.target = None
+
+    def __call__(self, engine, rng):
+        if self.piece != engine.pieces:
+            self.piece = engine.pieces
+            self.target = best_placement(engine.board.row_masks, [engine.active_shape] + list(engine.queue),
+                                         engine.board.columns)
+        if self.target is None:
+            return []
+        if engine.orientation != self.target.orientation:
+            return ['rotate']
+        if engine.column < self.target.column:
+            return ['right']
+        if engine.column > self.target.column:
+            return ['left']
+        return []
+
+
+# Policies are looked up by name so only the name has to be sent to the worker processes.  Each game gets a new
+# policy object, which is called every tick with the engine and a random number generator of its own and returns the
+# actions to apply on that tick.
+POLICIES = {
+    'random': RandomPolicy,
+    'greedy': GreedyPolicy,
+}
+
+
+def play_game(policy_name, seed, tick=100, max_pieces=10000, **engine_options):
+    """
+        Play one game with the named policy until it is lost or max_pieces tetrominos have been locked.  The engine's
+        clock advances tick milliseconds per policy call.  The duration is the game's time in seconds on that clock.
+    """
+    policy = POLICIES[policy_name]()
+    # The policy's generator is seeded apart from the engine's so its choices don't follow the piece sequence.
+    rng = Random(f'{policy_name}-{seed}')
+    engine = GameEngine(seed=seed, **engine_options)
+
+    start = time.perf_counter()
+    now = 0
+    while not engine.lost and engine.pieces < max_pieces:
+        now += tick
+        engine.update(now, [action for action in policy(engine, rng) if action is not None])
+    wall_time = time.perf_counter() - start
+
+    return GameResult(policy_name, seed, engine.score, engine.lines, engine.pieces, now / 1000, wall_time)
+
+
+def play_games(policy_name, seeds, **options):
+    return [play_game(policy_name, seed, **options) for seed in seeds]
+
+
+def run_tournament(policy_name, seeds, workers=None, chunk_size=50, **options):
+    """
+        Spread the seeded games across a pool of worker processes and yield each GameResult as soon as the chunk of
+        games it was played in finishes.  Games are sent in chunks so the cost of starting a task is shared by many
+        games.
+    """
+    seeds = list(seeds)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(play_games, policy_name, seeds[index:index + chunk_size], **options)
+                   for index in range(0, len(seeds), chunk_size)]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play seeded games with a policy across worker processes.')
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='random')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--first-seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=50)
+    parser.add_argument('--max-pieces', type=int, default=10000)
+    parser.add_argument('--randomizer', choices=RANDOMIZERS, default='random')
+    arguments = parser.parse_args()
+
+    writer = csv.writer(sys.stdout)
+    writer.writerow(GameResult._fields)
+    seeds = range(arguments.first_seed, arguments.first_seed + arguments.games)
+    for result in run_tournament(arguments.policy, seeds, arguments.workers, arguments.chunk_size,
+                                 max_pieces=arguments.max_pieces, randomizer=arguments.randomizer):
+        writer.writerow(result)
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""
+    Two player versus mode over TCP.  Clearing two or more lines at once sends garbage rows to the opponent, which push
+    their stack up from the bottom.  The server pairs players in the order they join, gives both games of a match the
+    same seed and relays garbage and losses between them.  Run it on the machine hosting the match:
+
+        python versus.py --host 0.0.0.0 --port 7777
+
+    and set VERSUS_SERVER in main.py to its address on every player's machine.
+
+    The client's network code runs on an asyncio event loop in its own thread.  The game loop only ever touches bounded
+    queues that it never waits on, so a slow or lost connection can't stall a frame.  Messages from one frame are sent
+    together as one write and the round trip time to the server is measured with a ping every second.
+"""
+
+import argparse
+import asyncio
+import queue
+import struct
+import time
+from collections import deque
+from random import Random
+
+from network_thread import NetworkThread
+
+PORT = 7777
+
+# Every message is a type byte and a signed 64-bit value.
+MESSAGE = struct.Struct('<Bq')
+JOIN, START, GARBAGE, LOST, WIN, PING, PONG, DISCONNECTED = range(8)
+
+# Garbage rows sent for clearing one, two, three and four lines at once.
+GARBAGE_LINES = (0, 0, 1, 2, 4)
+
+
+def encode(kind, value=0):
+    return MESSAGE.pack(kind, value)
+
+
+def decode(buffer):
+    # Split the complete messages off the front of a bytearray, leaving any partial message in it.
+    end = len(buffer) - len(buffer) % MESSAGE.size
+    messages = list(MESSAGE.iter_unpack(buffer[:end]))
+    del buffer[:end]
+    return messages
+
+
+class VersusServer:
+    """
+        Pairs the players that join into matches of two and relays each player's garbage and loss to their opponent.
+        The seed of every match comes from the server's own random generator.
+    """
+    def __init__(self, seed=None):
+        self.random = Random(seed)
+        self.waiting = None
+        self.opponents = {}
+
+    async def handle_client(self, reader, writer):
+        buffer = bytearray()
+        try:
+            while True:
+                data = await reader.read(4096)
+                if not data:
+                    break
+                buffer += data
+                for kind, value in decode(buffer):
+                    self.handle_message(writer, kind, value)
+                # Relayed messages are written to the opponent's buffer above and sent here in one go.
+                opponent = self.opponents.get(writer)
+                if opponent is not None:
+                    try:
+                        await opponent.drain()
+                    except ConnectionError:
+                        # The opponent's own handler ends the match when it sees the connection is gone.
+                        pass
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.leave(writer)
+            writer.close()
+
+    def handle_message(self, writer, kind, value):
+        if kind == PING:
+            writer.write(encode(PONG, value))
+        elif kind == JOIN:
+            self.join(writer)
+        elif kind == GARBAGE:
+            opponent = self.opponents.get(writer)
+            if opponent is not None:
+                opponent.write(encode(GARBAGE, value))
+        elif kind == LOST:
+            self.end_match(writer)
+
+    def join(self, writer):
+        if writer in self.opponents or self.waiting is writer:
+            return
+        if self.waiting is None or self.waiting.is_closing():
+            self.waiting = writer
+            return
+        opponent = self.waiting
+        self.waiting = None
+        self.opponents[writer] = opponent
+        self.opponents[opponent] = writer
+        seed = self.random.getrandbits(63)
+        writer.write(encode(START, seed))
+        opponent.write(encode(START, seed))
+
+    def end_match(self, loser):
+        # The loser's opponent wins and both players can join another match.
+        opponent = self.opponents.pop(loser, None)
+        if opponent is not None:
+            self.opponents.pop(opponent, None)
+            opponent.write(encode(WIN))
+
+    def leave(self, writer):
+        if self.waiting is writer:
+            self.waiting = None
+        self.end_match(writer)
+
+    async def serve(self, host='127.0.0.1', port=PORT):
+        server = await asyncio.start_server(self.handle_client, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+class VersusClient(NetworkThread):
+    """
+        A connection to a versus server that the game loop can use without ever blocking.  send() adds a message to
+        the current frame's batch and flush() hands the batch to the network thread, keeping it for the next frame if
+        the outgoing queue is full.  receive() returns the messages that have arrived since it was last called.  The
+        round trip times in milliseconds of the pings since the last call are returned by take_round_trips().
+    """
+    def __init__(self, host='127.0.0.1', port=PORT, queue_size=64, ping_interval=1.0):
+        self.ping_interval = ping_interval
+        self.incoming = queue.Queue(maxsize=queue_size)
+        self.batch = bytearray()
+        self.round_trips = deque(maxlen=queue_size)
+        super().__init__(host, port, queue_size)
+
+    async def connect(self):
+        try:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        except OSError:
+            await self.put_incoming((DISCONNECTED, 0))
+            return
+        tasks = [asyncio.ensure_future(coroutine)
+                 for coroutine in (self.read_messages(reader), self.write_outgoing(writer), self.ping())]
+        try:
+            await asyncio.gather(*tasks)
+        except ConnectionError:
+            await self.put_incoming((DISCONNECTED, 0))
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def put_incoming(self, message):
+        # The game empties the queue every frame, so it's only full if the game has stopped taking messages.  Waiting
+        # for room in another thread keeps the event loop free for pings and writes in the meantime.
+        try:
+            self.incoming.put_nowait(message)
+        except queue.Full:
+            await asyncio.to_thread(self.incoming.put, message)
+
+    async def read_messages(self, reader):
+        buffer = bytearray()
+        while True:
+            data = await reader.read(4096)
+            if not data:
+                raise ConnectionResetError("The versus server closed the connection")
+            buffer += data
+            for kind, value in decode(buffer):
+                if kind == PONG:
+                    self.round_trips.append((time.perf_counter_ns() - value) / 1e6)
+                else:
+                    await self.put_incoming((kind, value))
+
+    async def ping(self):
+        while True:
+            self.put(encode(PING, time.perf_counter_ns()))
+            await asyncio.sleep(self.ping_interval)
+
+    def send(self, kind, value=0):
+        self.batch += encode(kind, value)
+
+    def send_line_clear(self, lines):
+        garbage = GARBAGE_LINES[min(lines, len(GARBAGE_LINES) - 1)]
+        if garbage:
+            self.send(GARBAGE, garbage)
+
+    def flush(self):
+        # Hand this frame's messages to the network thread in one batch.
+        if self.batch and self.put(bytes(self.batch)):
+            self.batch.clear()
+
+    def receive(self):
+        messages = []
+        while True:
+            try:
+                messages.append(self.incoming.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def take_round_trips(self):
+        round_trips = []
+        while self.round_trips:
+            round_trips.append(self.round_trips.popleft())
+        return round_trips
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a versus server that pairs players into matches.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--seed', type=int, default=None, help='seed for the seeds of the matches')
+    arguments = parser.parse_args()
+    try:
+        asyncio.run(VersusServer(arguments.seed).serve(arguments.host, arguments.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()